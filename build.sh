@@ -12,25 +12,16 @@ python manage.py showmigrations
 echo "=== 3. Применяем миграции ==="
 python manage.py migrate --noinput
 
-echo "=== 4. ТОЛЬКО ПРОВЕРКА: создаём суперпользователя БЕЗ профиля ==="
-python manage.py shell << EOF
-from django.contrib.auth import get_user_model
-User = get_user_model()
-
-if not User.objects.filter(username='admin').exists():
-    # Временно отключаем сигнал создания профиля
-    from django.db.models import signals
-    from store import models
-    signals.post_save.disconnect(models.create_user_profile, sender=User)
-
-    # Создаём пользователя
-    user = User.objects.create_superuser('admin', 'admin@example.com', 'Admin123!smartexamplewordnumbertwoandrdfmodsfklsmasmdla')
-    print(f'Суперпользователь {user.username} создан (профиль будет создан позже)')
-else:
-    print('Суперпользователь уже существует')
-EOF
-
-echo "=== 5. Сбор статических файлов ==="
+echo "=== 3.1. Суперпользователь и начальные данные (один раз за деплой) ==="
+python manage.py boot
+
+echo "=== 3.2. Пересчитываем итоговые цены по акциям ==="
+python manage.py rebuild_effective_prices
+
+echo "=== 3.3. Переносим корзины из базы в Redis (если еще не перенесены) ==="
+python manage.py import_db_carts
+
+echo "=== 4. Сбор статических файлов ==="
 python manage.py collectstatic --noinput
 
 echo "=== СБОРКА ЗАВЕРШЕНА ==="
\ No newline at end of file
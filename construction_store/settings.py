@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 import environ
 
@@ -15,15 +16,24 @@ LOGOUT_REDIRECT_URL = '/'
 
 
 
+# Порт 6543 — pgbouncer Supabase в режиме transaction pooling. Соединение
+# с pgbouncer держим открытым между запросами (CONN_MAX_AGE) и проверяем
+# перед использованием (CONN_HEALTH_CHECKS), чтобы не платить TLS-рукопожатие
+# на каждый запрос. Серверные курсоры в этом режиме не работают — отключены.
+# Переменные DB_* позволяют подставить локальный Postgres + pgbouncer
+# (см. manage.py bench_db_connections).
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'postgres',
-        'USER': 'postgres.jfzkqlynhzlzbuqihbxj',
+        'NAME': os.getenv('DB_NAME', 'postgres'),
+        'USER': os.getenv('DB_USER', 'postgres.jfzkqlynhzlzbuqihbxj'),
         'PASSWORD': os.getenv('DB_PASSWORD'),  # Из переменных окружения
-        'HOST': 'aws-1-eu-west-1.pooler.supabase.com',
-        'PORT': '6543',
-        'OPTIONS': {'sslmode': 'require'},
+        'HOST': os.getenv('DB_HOST', 'aws-1-eu-west-1.pooler.supabase.com'),
+        'PORT': os.getenv('DB_PORT', '6543'),
+        'OPTIONS': {'sslmode': os.getenv('DB_SSLMODE', 'require')},
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 300)),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': True,
     }
 }
 # Supabase настройки
@@ -59,6 +69,11 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'store.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 # DATABASES = {
@@ -127,6 +142,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'store.metrics.MetricsMiddleware',
+    # Включается REQUEST_PROFILING=1, иначе отключается сам
+    'store.profiling.RequestProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -148,6 +166,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'store.context_processors.cart_context',
+                'store.context_processors.categories_context',
+                'store.context_processors.page_cache_context',
             ],
         },
     },
@@ -186,6 +206,19 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 #MEDIA_ROOT = BASE_DIR / 'media'
 
+# Временные файлы очереди загрузки изображений. Пусто — MEDIA_ROOT/upload_queue
+# на локальном диске, этого хватает только без отдельного воркера
+UPLOAD_QUEUE_DIR = os.getenv('UPLOAD_QUEUE_DIR', '')
+# UPLOAD_WORKER=1 — загрузки выполняет отдельный процесс run_upload_worker
+# (Procfile), иначе фоновый поток веб-процесса после сохранения
+UPLOAD_WORKER = os.getenv('UPLOAD_WORKER') == '1'
+if UPLOAD_WORKER and not UPLOAD_QUEUE_DIR:
+    # Воркер — другой процесс (на Render — другой инстанс): локальную папку
+    # веб-процесса он не увидит, и все задания упадут с "файл не найден"
+    raise ImproperlyConfigured(
+        'UPLOAD_WORKER=1 требует UPLOAD_QUEUE_DIR — общую папку веб-процесса и воркера (persistent disk)'
+    )
+
 # Bucket name в Supabase Storage
 SUPABASE_STORAGE_BUCKET = 'products'
 
@@ -194,6 +227,21 @@ CRISPY_TEMPLATE_PACK = 'bootstrap5'
 
 CART_SESSION_ID = 'cart'
 
+# Где хранится корзина: хеш Redis на сессию или таблица Cart
+# ('store.cart.DatabaseCartBackend')
+CART_BACKEND = os.getenv('CART_BACKEND', 'store.cart.RedisCartBackend')
+
+# Профилирование запросов (store/profiling.py): заголовок Server-Timing и
+# выборочный JSON-лог в логгер store.profiling
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING') == '1'
+REQUEST_PROFILING_SAMPLE_RATE = float(os.getenv('REQUEST_PROFILING_SAMPLE_RATE', 0.05))
+REQUEST_PROFILING_SLOW_MS = int(os.getenv('REQUEST_PROFILING_SLOW_MS', 500))
+
+# Метрики Prometheus (/metrics, store/metrics.py). Запрос должен передать
+# заголовок Authorization: Bearer <токен>; без токена /metrics закрыт (403),
+# кроме DEBUG
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Добавьте этот код в конец settings.py или в файл, который импортируется при запуске
@@ -278,83 +326,5 @@ CACHE_MIDDLEWARE_EXCLUDED_PATHS = [
     r'^/api/auth/',
     r'^/dashboard/',
 ]
-# === АВТОМАТИЧЕСКАЯ НАСТРОЙКА ПРИ ЗАПУСКЕ ===
-import os
-import sys
-import time
-import logging
-import threading
-
-logger = logging.getLogger(__name__)
-
-
-
-def startup_tasks():
-    """Задачи, выполняемые после полного запуска Django"""
-    time.sleep(3)  # Ждем полной инициализации Django
-
-    try:
-        print("🚀 Запуск startup_tasks...")
-
-        # 1. Проверяем/создаем суперпользователя
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-
-        username = 'admin'
-        email = 'admin@example.com'
-        password = 'mafdogmldkmflskmfafmoiewSJNSKFJSF312312!!'  # ⚠️ ЗАМЕНИТЕ!
-
-        user, created = User.objects.get_or_create(
-            username=username,
-            defaults={'email': email, 'is_staff': True, 'is_superuser': True}
-        )
-
-        if created:
-            user.set_password(password)
-            user.save()
-            print(f'✅ Создан суперпользователь "{username}"')
-        else:
-            # Сбрасываем пароль на известный
-            user.set_password(password)
-            user.save()
-            print(f'✅ Пароль для "{username}" сброшен')
-
-        # 2. Загружаем данные магазина
-        from django.core.management import call_command
-        from store.models import Category, Product
-
-        # Проверяем, есть ли уже данные
-        if Category.objects.count() == 0 or Product.objects.count() == 0:
-            print("📦 Загружаю данные магазина...")
-
-            # Пробуем разные файлы
-            fixtures = ['unicode_fixed_data.json', 'store_data.json', 'data.json']
-            for fixture in fixtures:
-                if os.path.exists(fixture):
-                    try:
-                        call_command('loaddata', fixture)
-                        print(f"✅ Данные загружены из {fixture}")
-                        break
-                    except Exception as e:
-                        print(f"❌ Ошибка загрузки {fixture}: {e}")
-
-        # 3. Выводим итоги
-        print("\n📊 ИТОГО В БАЗЕ:")
-        print(f"   Категорий: {Category.objects.count()}")
-        print(f"   Товаров: {Product.objects.count()}")
-        print(f"   Пользователей: {User.objects.count()}")
-        print(f"\n🔑 ДАННЫЕ ДЛЯ ВХОДА В АДМИНКУ:")
-        print(f"   URL: https://tau-website-stroymarket777.onrender.com/admin/")
-        print(f"   Логин: {username}")
-        print(f"   Пароль: {password}")
-
-    except Exception as e:
-        print(f"⚠️ Ошибка в startup_tasks: {e}")
-
-
-# Запускаем в отдельном потоке при старте
-if os.environ.get('RENDER'):
-    print("🔄 RENDER detected, scheduling startup tasks...")
-    thread = threading.Thread(target=startup_tasks)
-    thread.daemon = True
-    thread.start()
\ No newline at end of file
+# Суперпользователь и начальные данные создаются один раз за деплой командой
+# `python manage.py boot` (build.sh), а не в каждом воркере при импорте настроек
@@ -3,9 +3,11 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 import views
+from store.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('', include('store.urls')),
     path('check-data/', views.check_data, name='check_data'),
     path('check-fixtures/', views.check_fixtures, name='check_fixtures'),
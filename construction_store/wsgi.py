@@ -13,4 +13,9 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'construction_store.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Индекс подсказок поиска строим при старте воркера, а не на первом запросе
+from store.suggest import warm_up  # noqa: E402
+
+warm_up()
@@ -0,0 +1,20 @@
+# Настройки gunicorn (подхватываются автоматически из текущей папки).
+#
+# Метрики Prometheus (store/metrics.py) в multiprocess-режиме: воркеры пишут
+# счетчики в файлы общей папки, /metrics складывает их.
+import os
+import shutil
+
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus_multiproc')
+
+
+def on_starting(server):
+    # Файлы прошлого запуска дали бы завышенные счетчики
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
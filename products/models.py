@@ -2,9 +2,8 @@
 import os
 from django.db import models
 from django.core.files.storage import FileSystemStorage
-from supabase import create_client, Client
+from store.uploads import defer_image_upload, enqueue_pending_uploads
 from io import BytesIO
-from PIL import Image
 import uuid
 
 import logging
@@ -40,33 +39,19 @@ class Product(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
-        # ВАЖНО: Читаем файл ДО вызова upload_to_supabase
-        file_content = None
-        file_name = None
-
         if self.image_file and hasattr(self.image_file, 'file'):
             print(f"SAVE: Найден файл {self.image_file.name}")
 
-            # 1. Сохраняем имя и читаем содержимое
-            file_name = self.image_file.name
-            original_file = self.image_file.file
-            original_file.seek(0)
-            file_content = original_file.read()
-            original_file.seek(0)  # Возвращаемся в начало для возможного повторного чтения
-
-            # 2. Загружаем в Supabase
-            supabase_url = self.upload_to_supabase()
-
-            if supabase_url:
-                # Сохраняем URL
-                self.image_url = supabase_url
-                print(f"SAVE: URL сохранен: {supabase_url}")
+            # Ставим в очередь загрузки в Supabase (URL запишет воркер);
+            # файл читается один раз — при копировании в очередь
+            self.upload_to_supabase()
 
         # Вызываем родительский save
         super().save(*args, **kwargs)
+        queued = enqueue_pending_uploads(self)
 
-        # 3. ПОСЛЕ сохранения очищаем поле (если загрузка удалась)
-        if self.image_file and self.image_url and hasattr(self.image_file, 'file'):
+        # 3. ПОСЛЕ сохранения очищаем поле (файл уже скопирован в очередь)
+        if self.image_file and queued and hasattr(self.image_file, 'file'):
             try:
                 self.image_file.delete(save=False)
                 # Не очищаем self.image_file = None, чтобы не ломать админку
@@ -76,19 +61,13 @@ class Product(models.Model):
                 pass
 
     def upload_to_supabase(self):
-        """Загрузка изображения в Supabase Storage"""
+        """Ставит изображение в очередь загрузки в Supabase Storage"""
         try:
             # Проверяем, есть ли файл
             if not self.image_file or not hasattr(self.image_file, 'file'):
                 print("Нет файла для загрузки")
                 return None
 
-            # Инициализация клиента Supabase
-            supabase: Client = create_client(
-                os.environ.get('SUPABASE_URL'),
-                os.environ.get('SUPABASE_SERVICE_KEY')
-            )
-
             # Получаем оригинальный файл
             original_file = self.image_file.file
 
@@ -115,33 +94,20 @@ class Product(models.Model):
 
             print(f"Content-Type: {content_type}")
 
-            # Читаем файл
+            # Оптимизируем изображение (опционально); Pillow читает файл сам,
+            # целиком в память он не копируется
             original_file.seek(0)  # Важно: переходим в начало файла
-            file_content = original_file.read()
-
-            # Оптимизируем изображение (опционально)
+            upload_file = original_file
             if file_extension in ['.jpg', '.jpeg', '.png', '.webp']:
-                optimized_content = self.optimize_image(file_content, file_extension)
+                optimized_content = self.optimize_image(original_file, file_extension)
                 if optimized_content:
-                    file_content = optimized_content
+                    upload_file = optimized_content
 
-            # Загружаем в Supabase Storage
-            print(f"Загружаем файл {unique_filename} ({len(file_content)} bytes)...")
-
-            response = supabase.storage.from_('products').upload(
-                unique_filename,
-                file_content,
-                {
-                    "content-type": content_type,
-                    "cache-control": "public, max-age=31536000"
-                }
-            )
-
-            # Получаем публичный URL
-            public_url = supabase.storage.from_('products').get_public_url(unique_filename)
-
-            print(f"✅ Файл загружен в Supabase: {public_url}")
-            return public_url
+            # Загрузит воркер очереди и запишет публичный URL в image_url;
+            # неоптимизированный файл копируется в очередь по кускам
+            defer_image_upload(self, 'image_url', upload_file, unique_filename, content_type,
+                               save_public_url=True)
+            return None
 
         except Exception as e:
             print(f"❌ Ошибка загрузки в Supabase: {e}")
@@ -149,10 +115,13 @@ class Product(models.Model):
             traceback.print_exc()
             return None
 
-    def optimize_image(self, file_content, extension):
-        """Оптимизация изображения перед загрузкой"""
+    def optimize_image(self, source, extension):
+        """Оптимизация изображения перед загрузкой (source — открытый файл)"""
+        # Pillow импортируется при первой загрузке, а не при старте процесса
+        from PIL import Image
+
         try:
-            img = Image.open(BytesIO(file_content))
+            img = Image.open(source)
 
             # Конвертируем в RGB если нужно
             if img.mode in ('RGBA', 'P'):
@@ -174,8 +143,7 @@ class Product(models.Model):
             else:
                 return None
 
-            output.seek(0)
-            return output.read()
+            return output.getvalue()
 
         except Exception as e:
             print(f"Ошибка оптимизации: {e}")
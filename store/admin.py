@@ -1,5 +1,8 @@
-from django.contrib import admin
-from .models import Category, Product, ProductImage, Order, OrderItem, Cart
+from django.contrib import admin, messages
+from .models import (
+    Category, Product, ProductImage, Order, OrderItem, Cart, ImageUploadJob, StorageDeleteJob,
+    delete_from_supabase,
+)
 from django.utils.html import format_html
 from django import forms
 from django.utils.text import slugify
@@ -7,9 +10,30 @@ from django.utils.html import format_html
 from .models import Product, Category, ProductImage
 import os
 import uuid
-from supabase import create_client
+from .deletions import retry_delete_jobs
+from .uploads import defer_image_upload, retry_jobs, with_upload_status
+from .images import thumbnail_url
 from django.conf import settings
 
+UPLOAD_STATUS_ICONS = {
+    ImageUploadJob.STATUS_PENDING: '⏳',
+    ImageUploadJob.STATUS_RUNNING: '📤',
+    ImageUploadJob.STATUS_DONE: '✅',
+    ImageUploadJob.STATUS_FAILED: '❌',
+}
+
+
+def upload_status_display(obj):
+    """Статус последней фоновой загрузки изображения (см. with_upload_status)"""
+    status = getattr(obj, 'upload_status', None)
+    if not status:
+        return "—"
+    return f"{UPLOAD_STATUS_ICONS[status]} {dict(ImageUploadJob.STATUS_CHOICES)[status]}"
+
+
+upload_status_display.short_description = "Загрузка"
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'slug']
@@ -19,12 +43,15 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
-    list_display = ['product', 'alt_text', 'order', 'image_preview']
+    list_display = ['product', 'alt_text', 'order', 'image_preview', upload_status_display]
     list_filter = ['product']
     ordering = ['product', 'order']
 
+    def get_queryset(self, request):
+        return with_upload_status(super().get_queryset(request))
+
     def image_preview(self, obj):
-        image_url = obj.get_image_url()
+        image_url = thumbnail_url(obj)
         if image_url:
             return format_html(
                 '<img src="{}" style="max-height: 50px;" />',
@@ -115,12 +142,8 @@ class ProductForm(forms.ModelForm):
         """Удаляет старый файл из Supabase"""
         old_value = instance.__dict__.get(field_name)
         if old_value:
-            try:
-                supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-                supabase.storage.from_('products').remove([old_value])
-                print(f"🗑️ Удален старый файл из Supabase: {old_value}")
-            except Exception as e:
-                print(f"⚠️ Не удалось удалить файл из Supabase: {e}")
+            # Удалится после коммита вместе с остальными файлами транзакции
+            delete_from_supabase(old_value)
 
     def upload_to_supabase(self, instance, field_name):
         """Загружает файл в Supabase"""
@@ -141,66 +164,31 @@ class ProductForm(forms.ModelForm):
         }
         content_type = content_types.get(ext, 'image/jpeg')
 
-        # Загружаем
+        # Ставим в очередь: загрузит воркер и сам запишет путь в поле
         try:
-            supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-            file_content = image_file.read()
-
-            supabase.storage.from_('products').upload(
-                filepath,
-                file_content,
-                {"content-type": content_type}
-            )
-
-            # Сохраняем путь
-            setattr(instance, field_name, filepath)
-            print(f"✅ Изображение загружено в Supabase: {filepath}")
-
+            defer_image_upload(instance, field_name, image_file, filepath, content_type)
         except Exception as e:
-            print(f"❌ Ошибка загрузки в Supabase: {e}")
+            print(f"❌ Ошибка постановки в очередь загрузки: {e}")
 
     def upload_local_to_supabase(self, instance):
         """Загружает локальное изображение в Supabase"""
         if not instance.image_file:
             return
 
-        # ВАЖНО: Файл может быть еще не сохранен на диск!
-
-        # Способ 1: Чтение из памяти (если файл еще не сохранен)
-        if hasattr(instance.image_file, 'file'):
-            # Файл в памяти
-            file_content = instance.image_file.read()
-            instance.image_file.seek(0)  # Возвращаем позицию чтения
-        else:
-            # Файл уже сохранен на диск
-            try:
-                with open(instance.image_file.path, 'rb') as f:
-                    file_content = f.read()
-            except (ValueError, OSError):
-                # Файл не существует на диске
-                print("⚠️ Файл еще не сохранен на диск")
-                return
-
         # Генерируем имя
         ext = os.path.splitext(instance.image_file.name)[1].lower()
         filename = f"product_{uuid.uuid4().hex[:8]}{ext}"
         filepath = f"products/{filename}"
 
-        # Загружаем
+        # Файл может быть еще не сохранен на диск — берем его из памяти,
+        # иначе читаем с диска; загрузит воркер очереди
         try:
-            supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-            supabase.storage.from_('products').upload(
-                filepath,
-                file_content,
-                {"content-type": f"image/{ext[1:]}" if ext else 'image/jpeg'}
+            defer_image_upload(
+                instance, 'image', instance.image_file, filepath,
+                f"image/{ext[1:]}" if ext else 'image/jpeg'
             )
-
-            # Обновляем поле
-            instance.image = filepath
-            print(f"✅ Локальное изображение загружено в Supabase: {filepath}")
-
-        except Exception as e:
-            print(f"❌ Ошибка загрузки в Supabase: {e}")
+        except (ValueError, OSError) as e:
+            print(f"⚠️ Не удалось поставить локальное изображение в очередь: {e}")
 
 
 
@@ -249,23 +237,11 @@ class ProductImageForm(forms.ModelForm):
         }
         content_type = content_types.get(ext, 'image/jpeg')
 
-        # Загружаем
+        # Ставим в очередь: загрузит воркер и сам запишет путь в поле
         try:
-            supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-            file_content = image_file.read()
-
-            supabase.storage.from_('products').upload(
-                filepath,
-                file_content,
-                {"content-type": content_type}
-            )
-
-            # Сохраняем путь
-            setattr(instance, field_name, filepath)
-            print(f"✅ ProductImage: Изображение загружено в Supabase: {filepath}")
-
+            defer_image_upload(instance, field_name, image_file, filepath, content_type)
         except Exception as e:
-            print(f"❌ ProductImage: Ошибка загрузки в Supabase: {e}")
+            print(f"❌ ProductImage: Ошибка постановки в очередь загрузки: {e}")
             # Можно показать ошибку пользователю
             raise forms.ValidationError(f"Ошибка загрузки изображения: {e}")
 
@@ -274,34 +250,17 @@ class ProductImageForm(forms.ModelForm):
         if not instance.image_file:
             return
 
-        # Читаем локальный файл
-        file_path = instance.image_file.path if hasattr(instance.image_file, 'path') else None
-
-        if file_path and os.path.exists(file_path):
-            with open(file_path, 'rb') as f:
-                file_content = f.read()
-        else:
-            # Если файл в памяти
-            file_content = instance.image_file.read()
-            instance.image_file.seek(0)  # Возвращаем позицию
-
         # Генерируем имя
         ext = os.path.splitext(instance.image_file.name)[1].lower()
         filename = f"product_gallery_{uuid.uuid4().hex[:8]}{ext}"
         filepath = f"products/gallery/{filename}"
 
-        # Загружаем
-        supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-        supabase.storage.from_('products').upload(
-            filepath,
-            file_content,
-            {"content-type": f"image/{ext[1:]}" if ext else 'image/jpeg'}
+        # Ставим в очередь (файл копируется сразу — из памяти или с диска)
+        defer_image_upload(
+            instance, 'image', instance.image_file, filepath,
+            f"image/{ext[1:]}" if ext else 'image/jpeg'
         )
 
-        # Обновляем поле
-        instance.image = filepath
-        print(f"✅ ProductImage: Локальное изображение загружено в Supabase: {filepath}")
-
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     form = ProductImageForm
@@ -324,7 +283,7 @@ class ProductImageInline(admin.TabularInline):
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     form = ProductForm
-    list_display = ['name', 'category', 'price', 'stock', 'available','image_preview', 'created']
+    list_display = ['name', 'category', 'price', 'stock', 'available','image_preview', upload_status_display, 'created']
     list_filter = ['available', 'created', 'category']
     list_editable = ['price', 'stock', 'available']
     prepopulated_fields = {'slug': ('name',)}
@@ -357,9 +316,12 @@ class ProductAdmin(admin.ModelAdmin):
 
     readonly_fields = ['image_display']
 
+    def get_queryset(self, request):
+        return with_upload_status(super().get_queryset(request))
+
     def image_preview(self, obj):
         """Превью в списке"""
-        image_url = obj.get_main_image()
+        image_url = thumbnail_url(obj)
         if image_url:
             return format_html(
                 '<img src="{}" style="max-height: 50px; max-width: 50px;" />',
@@ -480,6 +442,46 @@ class ProductPromotionAdmin(admin.ModelAdmin):
     discount_info.short_description = 'Скидка'
 
 
+@admin.register(ImageUploadJob)
+class ImageUploadJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'model_label', 'object_id', 'field_name', 'path', 'status',
+                    'attempts', 'run_after', 'created_at', 'finished_at']
+    list_filter = ['status', 'model_label']
+    search_fields = ['path', 'last_error']
+    readonly_fields = [field.name for field in ImageUploadJob._meta.fields]
+    actions = ['retry_selected']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Повторить загрузку')
+    def retry_selected(self, request, queryset):
+        count = retry_jobs(queryset)
+        self.message_user(request, f'Возвращено в очередь: {count}')
+        skipped = queryset.exclude(status=ImageUploadJob.STATUS_DONE).count() - count
+        if skipped:
+            self.message_user(
+                request, f'Не повторить (временный файл удален, загрузите изображение заново): {skipped}',
+                level=messages.WARNING,
+            )
+
+
+@admin.register(StorageDeleteJob)
+class StorageDeleteJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'bucket', 'path', 'attempts', 'run_after', 'created_at']
+    search_fields = ['path', 'last_error']
+    readonly_fields = [field.name for field in StorageDeleteJob._meta.fields]
+    actions = ['retry_selected']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Повторить удаление')
+    def retry_selected(self, request, queryset):
+        count = retry_delete_jobs(queryset)
+        self.message_user(request, f'Возвращено в очередь: {count}')
+
+
 
 # from django.contrib import admin
 # from .models import Category, Product, ProductImage, Order, OrderItem, Cart
@@ -0,0 +1,225 @@
+"""
+Нагрузочный замер страниц витрины (manage.py bench_storefront).
+
+Каталог-синтетика (категории, товары, галереи, акции) заливается
+bulk_create в тестовую базу, затем каждая страница запрашивается через
+тестовый клиент Django. По каждой считаются SQL-запросы, p50/p95 времени
+ответа и пик выделенной памяти (tracemalloc, отдельным проходом — он
+замедляет выполнение). Перед каждым запросом кеш страниц сбрасывается,
+чтобы мерить саму страницу, а не попадание в кеш (store/page_cache.py).
+
+Кеш и корзина на время замера подменяются (isolated_services): кеш — в
+памяти процесса, Redis-корзина — в fakeredis, чтобы замер не сбрасывал
+кеш рабочего сайта и не читал из него данные.
+"""
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .page_cache import invalidate_page_cache
+
+CHECKOUT_DATA = {
+    'first_name': 'Бенч', 'last_name': 'Марк', 'email': 'bench@example.com', 'phone': '+70000000000',
+    'delivery_type': 'pickup', 'pickup_point': '1', 'payment_type': 'cash',
+    'delivery_address': 'ул. Тестовая, 1', 'note': '',
+}
+CART_SIZE = 5
+# Рост p95 меньше этого (мс) не считается регрессией, см. compare()
+LATENCY_SLACK_MS = 10
+SEARCH_QUERY = 'цемент'
+WORDS = ['цемент', 'кирпич', 'плитка', 'краска', 'гипсокартон', 'утеплитель', 'брус', 'профиль', 'смесь', 'шпатлевка']
+
+
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench-storefront',
+    }
+}
+
+
+@contextmanager
+def isolated_services():
+    """Кеш в памяти процесса и корзина вне рабочего Redis на время замера"""
+    from . import cart
+
+    # override_settings(CACHES) пересоздает соединения django.core.cache.caches
+    with override_settings(CACHES=BENCH_CACHES):
+        backend = import_string(getattr(settings, 'CART_BACKEND', cart.DEFAULT_BACKEND))()
+        if isinstance(backend, cart.RedisCartBackend):
+            import fakeredis
+            backend.__dict__['_redis'] = fakeredis.FakeRedis()
+        previous, cart._backend = cart._backend, backend
+        try:
+            yield
+        finally:
+            cart._backend = previous
+
+
+def seed_catalog(products=10000, categories=100, promotions=500, gallery=3, batch_size=2000):
+    """Заливает синтетический каталог; возвращает число товаров"""
+    from .models import Category, Product, ProductImage, Promotion, ProductPromotion, refresh_effective_prices
+
+    rng = random.Random(42)
+    now = timezone.now()
+
+    Category.objects.bulk_create([
+        Category(name=f'Категория {i}', slug=f'bench-category-{i}', description='Синтетическая категория')
+        for i in range(categories)
+    ], batch_size=batch_size)
+    category_ids = list(Category.objects.filter(slug__startswith='bench-category-').values_list('id', flat=True))
+
+    Product.objects.bulk_create([
+        Product(
+            category_id=category_ids[i % len(category_ids)],
+            name=f'{rng.choice(WORDS).capitalize()} {i}',
+            slug=f'bench-product-{i}',
+            brand=f'Бренд {i % 37}',
+            description=' '.join(rng.choices(WORDS, k=12)),
+            price=Decimal(rng.randint(50, 50000)),
+            stock=rng.randint(0, 500),
+            image=f'products/bench/{i}.jpg',
+            material=rng.choice(WORDS),
+        )
+        for i in range(products)
+    ], batch_size=batch_size)
+    product_ids = list(Product.objects.filter(slug__startswith='bench-product-').values_list('id', flat=True))
+
+    ProductImage.objects.bulk_create([
+        ProductImage(product_id=product_id, image=f'products/gallery/bench_{product_id}_{n}.jpg', order=n)
+        for product_id in product_ids for n in range(gallery)
+    ], batch_size=batch_size)
+
+    # Треть акций в будущем, остальные идут сейчас
+    Promotion.objects.bulk_create([
+        Promotion(
+            name=f'Акция {i}', slug=f'bench-promotion-{i}', description='Синтетическая акция',
+            discount_type=rng.choice(['percentage', 'fixed']), discount_value=Decimal(rng.randint(5, 30)),
+            start_date=now + timedelta(days=rng.randint(1, 30)) if i % 3 == 0 else now - timedelta(days=1),
+            end_date=now + timedelta(days=rng.randint(31, 60)),
+        )
+        for i in range(promotions)
+    ], batch_size=batch_size)
+    promotion_ids = list(Promotion.objects.filter(slug__startswith='bench-promotion-').values_list('id', flat=True))
+
+    links = {
+        (product_id, rng.choice(promotion_ids))
+        for product_id in rng.sample(product_ids, k=min(len(product_ids), len(promotion_ids) * 4))
+    }
+    ProductPromotion.objects.bulk_create([
+        ProductPromotion(product_id=product_id, promotion_id=promotion_id, priority=rng.randint(1, 10))
+        for product_id, promotion_id in links
+    ], batch_size=batch_size)
+
+    refresh_effective_prices()
+    return len(product_ids)
+
+
+def _fill_cart(client, product_ids):
+    for product_id in product_ids:
+        client.get(reverse('store:add_to_cart', args=[product_id]))
+
+
+def scenarios():
+    """[(имя, функция подготовки(client) -> None, функция запроса(client) -> response)]"""
+    from .models import Category, Product
+
+    product = Product.objects.filter(available=True, stock__gt=0, images__isnull=False).first()
+    category = Category.objects.filter(pk=product.category_id).first()
+    cart_ids = list(Product.objects.filter(available=True, stock__gte=1000).values_list('id', flat=True)[:CART_SIZE])
+    if len(cart_ids) < CART_SIZE:
+        # Запас на все прогоны оформления заказа
+        cart_ids = list(Product.objects.filter(available=True).values_list('id', flat=True)[:CART_SIZE])
+        Product.objects.filter(id__in=cart_ids).update(stock=1_000_000)
+
+    def fill(client):
+        _fill_cart(client, cart_ids)
+
+    def noop(client):
+        pass
+
+    return [
+        ('index', noop, lambda c: c.get(reverse('store:index'))),
+        ('category_view', noop, lambda c: c.get(category.get_absolute_url(), {'sort': 'price', 'page': 2})),
+        ('product_detail', noop, lambda c: c.get(product.get_absolute_url())),
+        ('search', noop, lambda c: c.get(reverse('store:search'), {'q': SEARCH_QUERY})),
+        ('cart_view', fill, lambda c: c.get(reverse('store:cart'))),
+        ('checkout', fill, lambda c: c.post(reverse('store:checkout'), CHECKOUT_DATA)),
+        ('api_promotions', noop, lambda c: c.get(reverse('store:api_promotions'))),
+    ]
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(len(values) * fraction) - 1))]
+
+
+def measure(prepare, request, iterations=30, warmup=3):
+    """Замер одной страницы: {'queries', 'p50_ms', 'p95_ms', 'peak_kb', 'status'}"""
+    client = Client()
+    timings = []
+    queries = 0
+    status = None
+
+    for i in range(warmup + iterations):
+        prepare(client)
+        invalidate_page_cache()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request(client)
+            elapsed = time.perf_counter() - started
+        status = response.status_code
+        if i >= warmup:
+            timings.append(elapsed * 1000)
+            queries = max(queries, len(captured.captured_queries))
+
+    # Память — отдельным запросом: tracemalloc искажает время
+    prepare(client)
+    invalidate_page_cache()
+    tracemalloc.start()
+    try:
+        request(client)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': status,
+        'queries': queries,
+        'p50_ms': round(_percentile(timings, 0.5), 2),
+        'p95_ms': round(_percentile(timings, 0.95), 2),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, max_query_increase=0, latency_threshold=0.25, memory_threshold=0.25,
+            latency_slack_ms=LATENCY_SLACK_MS):
+    """
+    Список регрессий относительно baseline (пустой — все в порядке).
+
+    Рост p95 меньше latency_slack_ms регрессией не считается: у быстрых
+    страниц +25% — это шум в пару миллисекунд.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result['queries'] > base['queries'] + max_query_increase:
+            regressions.append(f"{name}: запросов {result['queries']} (было {base['queries']})")
+        if result['p95_ms'] > max(base['p95_ms'] * (1 + latency_threshold), base['p95_ms'] + latency_slack_ms):
+            regressions.append(f"{name}: p95 {result['p95_ms']} мс (было {base['p95_ms']} мс)")
+        if result['peak_kb'] > base['peak_kb'] * (1 + memory_threshold):
+            regressions.append(f"{name}: память {result['peak_kb']} КБ (было {base['peak_kb']} КБ)")
+    return regressions
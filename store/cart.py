@@ -0,0 +1,309 @@
+"""
+Корзина покупателя.
+
+Содержимое корзины — это пары "товар -> количество", привязанные к ключу
+сессии. Где они лежат, решает бэкенд из settings.CART_BACKEND:
+
+* RedisCartBackend (по умолчанию) — один хеш Redis на сессию, каждое
+  изменение — одна команда HINCRBY/HSET/HDEL без записи в базу;
+* DatabaseCartBackend — прежняя таблица Cart.
+
+В базу корзина попадает только при оформлении заказа (см. checkout).
+Цены для всей корзины берутся одним запросом к товарам.
+
+Если Redis недоступен, чтение отдает пустую корзину, а изменение
+поднимает CartUnavailable — view показывает сообщение вместо ошибки 500.
+Строки старой таблицы Cart переносятся в Redis командой
+manage.py import_db_carts.
+"""
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'store.cart.RedisCartBackend'
+
+# Сводка для значка корзины кешируется до изменения корзины, но не дольше
+# этого срока — чтобы подхватить изменение цен
+SUMMARY_TTL = settings.CACHE_TTL['SHORT']
+
+
+class CartUnavailable(Exception):
+    """Хранилище корзины временно недоступно"""
+
+
+class BaseCartBackend:
+    """Хранилище строк корзины: {product_id: quantity} по ключу сессии"""
+
+    def get_lines(self, session_key):
+        raise NotImplementedError
+
+    def add(self, session_key, product_id, quantity=1):
+        raise NotImplementedError
+
+    def set(self, session_key, product_id, quantity):
+        raise NotImplementedError
+
+    def remove(self, session_key, product_id):
+        raise NotImplementedError
+
+    def clear(self, session_key):
+        raise NotImplementedError
+
+    def summary(self, session_key):
+        """(число единиц, сумма) корзины — один запрос цен к базе"""
+        from .models import Product
+
+        quantities = self.get_lines(session_key)
+        if not quantities:
+            return 0, Decimal('0')
+        prices = dict(Product.objects.filter(id__in=quantities).values_list('id', 'price'))
+        count = sum(quantity for product_id, quantity in quantities.items() if product_id in prices)
+        total = sum((prices[product_id] * quantity for product_id, quantity in quantities.items()
+                     if product_id in prices), Decimal('0'))
+        return count, total
+
+
+class RedisCartBackend(BaseCartBackend):
+    """Хеш Redis на сессию: поле — id товара, значение — количество"""
+
+    alias = 'default'
+
+    @cached_property
+    def _redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.alias)
+
+    def _key(self, session_key):
+        # Префикс и версия те же, что у остальных ключей кеша
+        return cache.make_key(f'cart:{session_key}')
+
+    def _touch(self, pipe, key):
+        # Корзина живет столько же, сколько сессия
+        pipe.expire(key, settings.SESSION_COOKIE_AGE)
+
+    def get_lines(self, session_key):
+        from redis.exceptions import RedisError
+
+        try:
+            raw = self._redis.hgetall(self._key(session_key))
+        except RedisError as e:
+            logger.warning(f"Не удалось прочитать корзину из Redis: {e}")
+            return {}
+        return {int(field): int(value) for field, value in raw.items() if int(value) > 0}
+
+    def _write(self, command):
+        """Выполняет command(); ошибку Redis превращает в CartUnavailable"""
+        from redis.exceptions import RedisError
+
+        try:
+            command()
+        except RedisError as e:
+            logger.warning(f"Не удалось изменить корзину в Redis: {e}")
+            raise CartUnavailable from e
+
+    def _pipeline(self, session_key, command, *args):
+        key = self._key(session_key)
+        pipe = self._redis.pipeline()
+        getattr(pipe, command)(key, *args)
+        self._touch(pipe, key)
+        pipe.execute()
+
+    def add(self, session_key, product_id, quantity=1):
+        self._write(lambda: self._pipeline(session_key, 'hincrby', product_id, quantity))
+
+    def set(self, session_key, product_id, quantity):
+        self._write(lambda: self._pipeline(session_key, 'hset', product_id, quantity))
+
+    def set_many(self, session_key, quantities):
+        """Записывает сразу несколько строк {product_id: quantity} (перенос из базы)"""
+        def command():
+            key = self._key(session_key)
+            pipe = self._redis.pipeline()
+            pipe.hset(key, mapping=quantities)
+            self._touch(pipe, key)
+            pipe.execute()
+
+        self._write(command)
+
+    def remove(self, session_key, product_id):
+        self._write(lambda: self._redis.hdel(self._key(session_key), product_id))
+
+    def clear(self, session_key):
+        self._write(lambda: self._redis.delete(self._key(session_key)))
+
+
+class DatabaseCartBackend(BaseCartBackend):
+    """Строки корзины в таблице Cart (как было до Redis)"""
+
+    @property
+    def _model(self):
+        from .models import Cart
+        return Cart
+
+    def get_lines(self, session_key):
+        rows = self._model.objects.filter(session_key=session_key).values_list('product_id', 'quantity')
+        return dict(rows)
+
+    def add(self, session_key, product_id, quantity=1):
+        from django.db.models import F
+
+        cart_item, created = self._model.objects.get_or_create(
+            session_key=session_key,
+            product_id=product_id,
+            defaults={'quantity': quantity},
+        )
+        if not created:
+            self._model.objects.filter(pk=cart_item.pk).update(quantity=F('quantity') + quantity)
+
+    def set(self, session_key, product_id, quantity):
+        self._model.objects.update_or_create(
+            session_key=session_key,
+            product_id=product_id,
+            defaults={'quantity': quantity},
+        )
+
+    def remove(self, session_key, product_id):
+        self._model.objects.filter(session_key=session_key, product_id=product_id).delete()
+
+    def clear(self, session_key):
+        self._model.objects.filter(session_key=session_key).delete()
+
+    def summary(self, session_key):
+        from django.db.models import F, Sum
+
+        totals = self._model.objects.filter(session_key=session_key).aggregate(
+            count=Sum('quantity'),
+            total=Sum(F('quantity') * F('product__price')),
+        )
+        return totals['count'] or 0, totals['total'] or Decimal('0')
+
+
+_backend = None
+
+
+def get_cart_backend():
+    """Экземпляр бэкенда корзины из settings.CART_BACKEND (один на процесс)"""
+    global _backend
+    if _backend is None:
+        _backend = import_string(getattr(settings, 'CART_BACKEND', DEFAULT_BACKEND))()
+    return _backend
+
+
+class CartLine:
+    """Строка корзины для шаблонов; id — это id товара (используется в URL)"""
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+
+    @property
+    def id(self):
+        return self.product.pk
+
+    @property
+    def total_price(self):
+        return self.quantity * self.product.price
+
+
+class SessionCart:
+    """Корзина текущей сессии поверх выбранного бэкенда"""
+
+    def __init__(self, request, backend=None):
+        self.request = request
+        self.backend = backend or get_cart_backend()
+
+    @property
+    def session_key(self):
+        return self.request.session.session_key
+
+    def _ensure_session(self):
+        if not self.request.session.session_key:
+            self.request.session.create()
+        return self.request.session.session_key
+
+    def quantities(self):
+        """{product_id: quantity} без обращения к базе"""
+        if not self.session_key:
+            return {}
+        return self.backend.get_lines(self.session_key)
+
+    def _summary_key(self):
+        return f'cart_summary:{self.session_key}'
+
+    def _changed(self):
+        self.__dict__.pop('lines', None)
+        if self.session_key:
+            cache.delete(self._summary_key())
+
+    def summary(self):
+        """(число единиц, сумма) для значка корзины: из кеша или одним запросом"""
+        if not self.session_key:
+            return 0, Decimal('0')
+        key = self._summary_key()
+        summary = cache.get(key)
+        if summary is None:
+            summary = self.backend.summary(self.session_key)
+            cache.set(key, summary, SUMMARY_TTL)
+        return summary
+
+    def add(self, product, quantity=1):
+        self.backend.add(self._ensure_session(), product.pk, quantity)
+        self._changed()
+
+    def update(self, product_id, quantity):
+        if not self.session_key:
+            return
+        if quantity > 0:
+            self.backend.set(self.session_key, product_id, quantity)
+        else:
+            self.backend.remove(self.session_key, product_id)
+        self._changed()
+
+    def remove(self, product_id):
+        if self.session_key:
+            self.backend.remove(self.session_key, product_id)
+        self._changed()
+
+    def clear(self):
+        """Очищает корзину; вызывается и после коммита заказа, поэтому не падает"""
+        if self.session_key:
+            try:
+                self.backend.clear(self.session_key)
+            except CartUnavailable:
+                # Заказ уже сохранен; корзина истечет вместе с сессией
+                pass
+        self._changed()
+
+    @cached_property
+    def lines(self):
+        """Строки корзины с товарами — один запрос на все товары"""
+        from .models import Product
+
+        quantities = self.quantities()
+        if not quantities:
+            return []
+        products = Product.objects.filter(id__in=quantities).order_by('name')
+        return [CartLine(product, quantities[product.pk]) for product in products]
+
+    @property
+    def total_price(self):
+        return sum((line.total_price for line in self.lines), Decimal('0'))
+
+    @property
+    def total_quantity(self):
+        return sum(line.quantity for line in self.lines)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
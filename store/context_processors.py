@@ -1,16 +1,34 @@
-from .models import Cart
+from django.utils.functional import SimpleLazyObject
+
+from .cart import SessionCart
+from .navigation import get_nav_categories
+from .page_cache import cache_generation
 
 
 def cart_context(request):
-    if request.session.session_key:
-        cart_items = Cart.objects.filter(session_key=request.session.session_key)
-        cart_count = sum(item.quantity for item in cart_items)
-        cart_total = sum(item.total_price for item in cart_items)
-    else:
-        cart_count = 0
-        cart_total = 0
+    """
+    Значок корзины в шапке.
+
+    Сводка считается только если шаблон обратится к cart_count/cart_total,
+    и берется из кеша сессии (см. SessionCart.summary).
+    """
+    summary = SimpleLazyObject(lambda: SessionCart(request).summary())
+
+    return {
+        'cart_count': SimpleLazyObject(lambda: summary[0]),
+        'cart_total': SimpleLazyObject(lambda: summary[1]),
+    }
+
+
+def categories_context(request):
+    """Категории для меню навигации — из кеша и только если шаблон к ним обратится"""
+    return {
+        'categories': SimpleLazyObject(get_nav_categories),
+    }
+
 
+def page_cache_context(request):
+    """Поколение кеша для тегов {% cache page_cache.ttl ... page_cache.token %}"""
     return {
-        'cart_count': cart_count,
-        'cart_total': cart_total,
-    }
\ No newline at end of file
+        'page_cache': SimpleLazyObject(cache_generation),
+    }
@@ -0,0 +1,171 @@
+"""
+Удаление файлов из Supabase пачками после коммита.
+
+Сигналы pre_delete (store/models.py) не ходят в Supabase сами, а
+складывают пути в пачку текущего savepoint. У каждого savepoint своя пачка
+и свой on_commit-колбэк: если savepoint откатился, Django выбрасывает его
+колбэк, и файлы строк, которые остались в базе, не удаляются. После
+коммита пачки сливаются и уходят в Supabase вызовами remove([...]) до
+REMOVE_BATCH путей — удаление 500 товаров из админки делает несколько
+запросов вместо тысяч.
+
+Пути, которые удалить не удалось, сохраняются в StorageDeleteJob;
+их повторяет воркер (manage.py run_upload_worker) с растущей паузой.
+"""
+import threading
+import weakref
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .supabase_client import get_bucket
+
+# Сколько путей отправлять в одном remove()
+REMOVE_BATCH = 1000
+MAX_ATTEMPTS = 5
+# Пауза перед повтором: RETRY_DELAY * 2 ** (попытка - 1) секунд
+RETRY_DELAY = 60
+
+_local = threading.local()
+
+
+class _DeleteBatch(list):
+    """Пары (bucket, путь) одного savepoint; сам является on_commit-колбэком"""
+
+    def __init__(self, savepoint):
+        super().__init__()
+        self.savepoint = savepoint
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        pending = _pending()
+        pending.extend(self)
+        # Колбэки пачек транзакции выполняются подряд — удаляем одним
+        # заходом после последней, а не по запросу на каждый savepoint
+        if not _live_batches():
+            by_bucket = {}
+            for bucket, path in pending:
+                by_bucket.setdefault(bucket, []).append(path)
+            pending.clear()
+            for bucket, paths in by_bucket.items():
+                flush_storage_deletes(paths, bucket=bucket)
+
+
+def _pending():
+    if not hasattr(_local, 'pending'):
+        _local.pending = []
+    return _local.pending
+
+
+def _live_batches():
+    """
+    Пачки, чьи колбэки еще ждут коммита. Хранятся слабые ссылки: колбэк
+    откатившегося savepoint Django выбрасывает, и пачка исчезает вместе с ним.
+    """
+    refs = getattr(_local, 'batches', [])
+    batches = [batch for batch in (ref() for ref in refs) if batch is not None and not batch.done]
+    _local.batches = [weakref.ref(batch) for batch in batches]
+    return batches
+
+
+def _current_batch(connection):
+    savepoint = tuple(connection.savepoint_ids)
+    for batch in _live_batches():
+        if batch.savepoint == savepoint:
+            return batch
+    batch = _DeleteBatch(savepoint)
+    transaction.on_commit(batch)
+    _local.batches.append(weakref.ref(batch))
+    return batch
+
+
+def schedule_storage_delete(paths, bucket=None):
+    """Удаляет файлы paths из bucket (None — по умолчанию) после коммита текущей транзакции"""
+    paths = [path for path in paths if path]
+    if not paths:
+        return
+
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        # Вне транзакции коммит уже произошел
+        flush_storage_deletes(paths, bucket=bucket)
+        return
+    _current_batch(connection).extend((bucket, path) for path in paths)
+
+
+def _remove(paths, bucket_name=None):
+    """Удаляет paths пачками; возвращает [(пути, ошибка), ...] для неудавшихся пачек"""
+    bucket = get_bucket(bucket_name)
+    failed = []
+    for offset in range(0, len(paths), REMOVE_BATCH):
+        chunk = paths[offset:offset + REMOVE_BATCH]
+        try:
+            bucket.remove(chunk)
+        except Exception as e:
+            failed.append((chunk, f"{type(e).__name__}: {e}"))
+    return failed
+
+
+def flush_storage_deletes(paths, bucket=None):
+    """Удаляет paths сразу; неудавшиеся ставит в очередь повторов"""
+    from .models import StorageDeleteJob
+
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        return
+
+    failed = _remove(paths, bucket)
+    for chunk, error in failed:
+        print(f"⚠️ Не удалось удалить {len(chunk)} файл(ов) из Supabase, повторим позже: {error}")
+        StorageDeleteJob.objects.bulk_create([
+            StorageDeleteJob(bucket=bucket or '', path=path, attempts=1, last_error=error,
+                             run_after=timezone.now() + timedelta(seconds=RETRY_DELAY))
+            for path in chunk
+        ])
+    removed = len(paths) - sum(len(chunk) for chunk, _ in failed)
+    if removed:
+        print(f"🗑️ Удалено файлов из Supabase: {removed}")
+
+
+def retry_storage_deletes(limit=REMOVE_BATCH):
+    """Повторяет удаления из очереди; возвращает (удалено, с ошибкой)"""
+    from .models import StorageDeleteJob
+
+    now = timezone.now()
+    with transaction.atomic():
+        # skip_locked — несколько воркеров не возьмут одни и те же пути.
+        # Задания сразу откладываются, как при ошибке, и транзакция
+        # закрывается: HTTP-запросы к Supabase идут без блокировок строк
+        jobs = list(
+            StorageDeleteJob.objects.select_for_update(skip_locked=True)
+            .filter(run_after__lte=now, attempts__lt=MAX_ATTEMPTS)[:limit]
+        )
+        if not jobs:
+            return 0, 0
+        for job in jobs:
+            job.attempts += 1
+            job.run_after = now + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+        StorageDeleteJob.objects.bulk_update(jobs, ['attempts', 'run_after'])
+
+    by_bucket = {}
+    for job in jobs:
+        by_bucket.setdefault(job.bucket, []).append(job.path)
+    failed_paths = {}
+    for bucket, paths in by_bucket.items():
+        for chunk, error in _remove(paths, bucket or None):
+            failed_paths.update({(bucket, path): error for path in chunk})
+
+    done = [job.pk for job in jobs if (job.bucket, job.path) not in failed_paths]
+    StorageDeleteJob.objects.filter(pk__in=done).delete()
+    failed = [job for job in jobs if (job.bucket, job.path) in failed_paths]
+    for job in failed:
+        job.last_error = failed_paths[(job.bucket, job.path)]
+    StorageDeleteJob.objects.bulk_update(failed, ['last_error'])
+    return len(done), len(failed)
+
+
+def retry_delete_jobs(queryset):
+    """Возвращает удаления в очередь (действие админки)"""
+    return queryset.update(attempts=0, run_after=timezone.now())
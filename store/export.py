@@ -0,0 +1,193 @@
+"""
+Потоковый экспорт данных магазина (manage.py export_store).
+
+Строки читаются через .iterator(chunk_size=...) и пишутся в файл сразу,
+по чанку, поэтому память не зависит от размера каталога. Каждая модель —
+свой файл в папке экспорта, формат — фикстура Django (jsonl или json,
+можно .gz), так что файлы загружаются обратно через loaddata в порядке
+из manifest.json (manifest_fixtures, его использует manage.py boot):
+
+    export/01_auth_user.jsonl.gz, export/02_store_category.jsonl.gz, ...
+
+После каждого чанка в manifest.json записывается последний pk и размер
+файла. Если экспорт прервался, повторный запуск с resume=True обрезает
+файл до последнего записанного чанка и продолжает с pk больше записанного.
+В gzip каждый чанк — отдельный gzip-member (многочленный gzip читается
+как один файл), поэтому обрезать можно по границе чанка.
+"""
+import gzip
+import json
+import os
+from itertools import islice
+
+from django.apps import apps
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+
+MANIFEST = 'manifest.json'
+CHUNK_SIZE = 2000
+FORMATS = ('jsonl', 'json')
+# Данные магазина, которые нельзя восстановить иначе. Не выгружаются:
+# contenttypes и auth.Permission — их создает migrate, при загрузке в новую
+# базу они конфликтуют; ProductEffectivePrice — пересчитывается командой
+# rebuild_effective_prices; Cart, ImageUploadJob, StorageDeleteJob —
+# временные очереди и корзины сессий
+DEFAULT_MODELS = (
+    'auth.User', 'auth.Group',
+    'store.Category', 'store.Product', 'store.ProductImage', 'store.UserProfile',
+    'store.Promotion', 'store.ProductPromotion', 'store.Order', 'store.OrderItem',
+)
+
+
+def resolve_models(labels, exclude=()):
+    """Модели по меткам 'app' или 'app.Model' в порядке зависимостей (как dumpdata)"""
+    selected = []
+    for label in labels or DEFAULT_MODELS:
+        if '.' in label:
+            models = [apps.get_model(label)]
+        else:
+            models = list(apps.get_app_config(label).get_models())
+        selected.extend(model for model in models if model not in selected)
+
+    excluded = {apps.get_model(label) for label in exclude if '.' in label}
+    excluded_apps = {label for label in exclude if '.' not in label}
+    selected = [
+        model for model in selected
+        if model not in excluded and model._meta.app_label not in excluded_apps
+    ]
+    app_list = {}
+    for model in selected:
+        app_list.setdefault(apps.get_app_config(model._meta.app_label), []).append(model)
+    return serializers.sort_dependencies(app_list.items(), allow_cycles=True)
+
+
+def _file_name(index, model, fmt, compress):
+    name = f'{index:02d}_{model._meta.app_label}_{model._meta.model_name}.{fmt}'
+    return name + '.gz' if compress else name
+
+
+def _load_manifest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_manifest(path, manifest):
+    # Через временный файл: прерванная запись не портит manifest
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, cls=DjangoJSONEncoder)
+    os.replace(tmp, path)
+
+
+def _write(raw, text, compress):
+    data = text.encode('utf-8')
+    if compress:
+        data = gzip.compress(data)
+    raw.write(data)
+
+
+def _queryset(model):
+    queryset = model._default_manager.order_by('pk')
+    m2m = [field.name for field in model._meta.many_to_many if field.remote_field.through._meta.auto_created]
+    if m2m:
+        # С iterator(chunk_size) prefetch выполняется на каждый чанк
+        queryset = queryset.prefetch_related(*m2m)
+    return queryset
+
+
+def _export_model(directory, entry, model, fmt, compress, chunk_size, save, progress):
+    path = os.path.join(directory, entry['file'])
+    queryset = _queryset(model)
+
+    if entry['offset']:
+        # Продолжаем: отрезаем недописанный чанк
+        raw = open(path, 'r+b')
+        raw.truncate(entry['offset'])
+        raw.seek(entry['offset'])
+        queryset = queryset.filter(pk__gt=entry['last_pk'])
+    else:
+        raw = open(path, 'wb')
+        if fmt == 'json':
+            _write(raw, '[', compress)
+
+    with raw:
+        rows = queryset.iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            objects = serializers.serialize('python', chunk)
+            lines = [json.dumps(obj, ensure_ascii=False, cls=DjangoJSONEncoder) for obj in objects]
+            if fmt == 'json':
+                separator = ',\n' if entry['count'] else '\n'
+                text = separator + ',\n'.join(lines)
+            else:
+                text = ''.join(line + '\n' for line in lines)
+            _write(raw, text, compress)
+            raw.flush()
+
+            entry['count'] += len(chunk)
+            entry['last_pk'] = chunk[-1].pk
+            entry['offset'] = raw.tell()
+            save()
+            if progress:
+                progress(entry)
+
+        if fmt == 'json':
+            _write(raw, '\n]\n', compress)
+    entry['done'] = True
+    save()
+
+
+def manifest_fixtures(directory):
+    """Файлы законченного экспорта в порядке загрузки (для loaddata)"""
+    manifest = _load_manifest(os.path.join(directory, MANIFEST))
+    if manifest is None:
+        raise ValueError(f'В {directory} нет {MANIFEST}')
+    unfinished = [entry['model'] for entry in manifest['models'] if not entry['done']]
+    if unfinished:
+        raise ValueError(f"Экспорт не закончен ({', '.join(unfinished)}), продолжите его с --resume")
+    # Пустые файлы loaddata считает ошибкой формата
+    return [os.path.join(directory, entry['file']) for entry in manifest['models'] if entry['count']]
+
+
+def export_store(directory, models, fmt='jsonl', compress=True, chunk_size=CHUNK_SIZE, resume=False, progress=None):
+    """
+    Выгружает models в папку directory; возвращает manifest.
+
+    progress(entry) вызывается после каждого чанка. С resume=True
+    законченные модели пропускаются, недописанная продолжается с места
+    обрыва (параметры берутся из прошлого manifest).
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST)
+    manifest = _load_manifest(manifest_path) if resume else None
+
+    if manifest:
+        fmt, compress = manifest['format'], manifest['gzip']
+        entries = {entry['model']: entry for entry in manifest['models']}
+        models = [apps.get_model(label) for label in entries]
+    else:
+        manifest = {'format': fmt, 'gzip': compress, 'models': []}
+        for index, model in enumerate(models, start=1):
+            manifest['models'].append({
+                'model': model._meta.label_lower,
+                'file': _file_name(index, model, fmt, compress),
+                'count': 0,
+                'last_pk': None,
+                'offset': 0,
+                'done': False,
+            })
+        entries = {entry['model']: entry for entry in manifest['models']}
+
+    def save():
+        _save_manifest(manifest_path, manifest)
+
+    save()
+    for model in models:
+        entry = entries[model._meta.label_lower]
+        if not entry['done']:
+            _export_model(directory, entry, model, fmt, compress, chunk_size, save, progress)
+    return manifest
@@ -0,0 +1,133 @@
+"""
+Фасетные фильтры каталога (бренд, материал, цвет, единица, цена).
+
+Счетчики каждой группы считаются одним агрегирующим запросом по выборке,
+отфильтрованной всеми остальными группами: так у выбранного бренда видно,
+сколько товаров дадут соседние бренды, а не только он сам.
+"""
+from django.db.models import Count, Q
+
+from .models import Product, annotate_sale_price
+
+FACET_FIELDS = [
+    ('brand', 'Бренд'),
+    ('material', 'Материал'),
+    ('color', 'Цвет'),
+    ('unit', 'Единица измерения'),
+]
+
+# Диапазоны цены (с учетом акций): ключ, от, до (не включая), подпись
+PRICE_RANGES = [
+    ('0-500', None, 500, 'до 500 ₽'),
+    ('500-2000', 500, 2000, '500 – 2 000 ₽'),
+    ('2000-10000', 2000, 10000, '2 000 – 10 000 ₽'),
+    ('10000-', 10000, None, 'от 10 000 ₽'),
+]
+
+PRICE_PARAM = 'price'
+
+_UNIT_LABELS = dict(Product.UNIT_CHOICES)
+
+
+def selected_facets(params):
+    """Выбранные значения фильтров из GET-параметров"""
+    selected = {}
+    for field, _ in FACET_FIELDS:
+        values = [value for value in params.getlist(field) if value]
+        if values:
+            selected[field] = values
+
+    known_ranges = {key for key, _, _, _ in PRICE_RANGES}
+    ranges = [key for key in params.getlist(PRICE_PARAM) if key in known_ranges]
+    if ranges:
+        selected[PRICE_PARAM] = ranges
+    return selected
+
+
+def _price_q(key):
+    for range_key, low, high, _ in PRICE_RANGES:
+        if range_key == key:
+            q = Q()
+            if low is not None:
+                q &= Q(effective_sale_price__gte=low)
+            if high is not None:
+                q &= Q(effective_sale_price__lt=high)
+            return q
+    return Q()
+
+
+def _group_q(group, values):
+    q = Q()
+    for value in values:
+        q |= _price_q(value) if group == PRICE_PARAM else Q(**{group: value})
+    return q
+
+
+def _filter(queryset, selected, skip=None):
+    for group, values in selected.items():
+        if group != skip:
+            queryset = queryset.filter(_group_q(group, values))
+    return queryset
+
+
+def apply_facets(queryset, selected):
+    """Применяет выбранные фильтры к queryset товаров"""
+    return _filter(annotate_sale_price(queryset), selected)
+
+
+def facet_counts(queryset, selected):
+    """
+    Возвращает группы фасетов со счетчиками для шаблона.
+
+    По одному GROUP BY-запросу на группу полей и один запрос на все
+    диапазоны цены.
+    """
+    queryset = annotate_sale_price(queryset)
+    groups = []
+
+    for field, label in FACET_FIELDS:
+        chosen = set(selected.get(field, []))
+        rows = (
+            _filter(queryset, selected, skip=field)
+            .exclude(**{field: ''})
+            .values(field)
+            .annotate(count=Count('id'))
+            .order_by(field)
+        )
+        values = [
+            {
+                'value': row[field],
+                'label': _UNIT_LABELS.get(row[field], row[field]) if field == 'unit' else row[field],
+                'count': row['count'],
+                'selected': row[field] in chosen,
+            }
+            for row in rows
+        ]
+        # Выбранное значение без товаров оставляем, чтобы его можно было снять
+        present = {item['value'] for item in values}
+        values += [
+            {'value': value, 'label': value, 'count': 0, 'selected': True}
+            for value in selected.get(field, []) if value not in present
+        ]
+        if values:
+            groups.append({'name': field, 'label': label, 'values': values})
+
+    chosen = set(selected.get(PRICE_PARAM, []))
+    counts = _filter(queryset, selected, skip=PRICE_PARAM).aggregate(**{
+        f'range_{index}': Count('id', filter=_price_q(key))
+        for index, (key, _, _, _) in enumerate(PRICE_RANGES)
+    })
+    values = [
+        {
+            'value': key,
+            'label': range_label,
+            'count': counts[f'range_{index}'],
+            'selected': key in chosen,
+        }
+        for index, (key, _, _, range_label) in enumerate(PRICE_RANGES)
+        if counts[f'range_{index}'] or key in chosen
+    ]
+    if values:
+        groups.append({'name': PRICE_PARAM, 'label': 'Цена', 'values': values})
+
+    return groups
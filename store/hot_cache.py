@@ -0,0 +1,214 @@
+"""
+Защита горячих ключей кеша от "лавины" (cache stampede).
+
+Когда популярный ключ истекает под нагрузкой, все запросы разом идут в
+базу за одним и тем же. Здесь три приема поверх кеша default (Redis):
+
+* single-flight — пересчитывает только тот, кто взял блокировку
+  (cache.add = SET NX), остальные ждут готового значения;
+* вероятностное раннее истечение (XFetch) — чем ближе срок и чем дольше
+  пересчет, тем вероятнее один из запросов обновит значение заранее;
+* stale-while-revalidate — после срока значение живет еще stale_ttl
+  секунд: пока один процесс пересчитывает, остальные отдают старое.
+
+Если кеш недоступен (django-redis с IGNORE_EXCEPTIONS возвращает None
+вместо ответа Redis, другие бэкенды бросают исключение), значение
+считается сразу, без блокировки и ожидания: ждать чужой пересчет имеет
+смысл, только когда блокировка действительно есть в кеше.
+
+В кеше лежит (значение, время пересчета, срок годности). Счетчики
+попаданий/промахов/пересчетов — в памяти процесса (stats()) и в метрике
+store_cache_requests_total (store/metrics.py).
+"""
+import logging
+import math
+import random
+import threading
+import time
+from collections import Counter, namedtuple
+
+
+from django.core.cache import cache
+
+from .metrics import CACHE_REQUESTS
+from .profiling import record_cache
+
+# Сколько секунд после срока годности можно отдавать старое значение
+STALE_TTL = 60
+# Коэффициент XFetch: больше 1 — обновлять раньше, меньше 1 — позже
+BETA = 1.0
+# Блокировка пересчета живет не дольше этого (на случай падения процесса)
+LOCK_TIMEOUT = 30
+# Сколько ждать значения, которое пересчитывает другой процесс
+WAIT_TIMEOUT = 5
+POLL_INTERVAL = 0.05
+# Сколько помнить, что значение не кешируется (404, ошибка, редирект)
+NEGATIVE_TTL = 10
+# Метка "не кешируется" вместо значения — строка, чтобы пережить pickle
+_NEGATIVE = '__hot_cache_negative__'
+
+HIT = 'hit'              # свежее значение
+STALE = 'stale'          # старое значение, пока пересчитывает другой
+WAITED = 'waited'        # дождались пересчета другого процесса
+MISS = 'miss'            # значения нет, пересчитываем сами
+RECOMPUTE = 'recompute'  # значение истекает (или рано), пересчитываем сами
+TIMEOUT = 'timeout'      # не дождались другого процесса, пересчитываем сами
+UNCACHED = 'uncached'    # значение не кешируется, каждый считает сам без блокировки
+UNAVAILABLE = 'unavailable'  # кеш недоступен, считаем сами без блокировки
+
+# locked — блокировка у нас, после пересчета нужно вызвать release()
+Lookup = namedtuple('Lookup', ['value', 'state', 'locked'])
+
+logger = logging.getLogger(__name__)
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(state):
+    with _stats_lock:
+        _stats[state] += 1
+    record_cache(state)
+    CACHE_REQUESTS.labels(state).inc()
+
+
+def stats():
+    """Счетчики процесса: {'hit': ..., 'stale': ..., 'miss': ..., ...}"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _get(key):
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.warning(f"Кеш недоступен (get {key}): {e}")
+        return None
+
+
+def _acquire(key):
+    """
+    True — блокировка наша, False — ее держит другой процесс, None — кеш
+    недоступен (add вернул None или упал)
+    """
+    try:
+        added = cache.add(_lock_key(key), 1, LOCK_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Кеш недоступен (add {key}): {e}")
+        return None
+    if added is None:
+        return None
+    return bool(added)
+
+
+def _set(key, value, timeout):
+    try:
+        cache.set(key, value, timeout)
+    except Exception as e:
+        logger.warning(f"Кеш недоступен (set {key}): {e}")
+
+
+def release(key):
+    try:
+        cache.delete(_lock_key(key))
+    except Exception as e:
+        logger.warning(f"Кеш недоступен (delete {key}): {e}")
+
+
+def lookup(key, beta=BETA, wait=WAIT_TIMEOUT):
+    """
+    Читает key и решает, кто его пересчитывает.
+
+    Если must_compute(lookup) (MISS, RECOMPUTE, TIMEOUT, UNCACHED, UNAVAILABLE), вызывающий должен
+    пересчитать значение и сохранить его через store() (и вызвать
+    release(key), если lookup.locked). Иначе lookup.value готово к отдаче.
+    """
+    envelope = _get(key)
+    if envelope is not None:
+        value, delta, expires_at = envelope
+        if value == _NEGATIVE:
+            _count(UNCACHED)
+            return Lookup(None, UNCACHED, False)
+        # XFetch: -log(u) > 0, поэтому "сейчас" сдвигается вперед случайно
+        if time.time() - delta * beta * math.log(1 - random.random()) < expires_at:
+            _count(HIT)
+            return Lookup(value, HIT, False)
+        if _acquire(key):
+            _count(RECOMPUTE)
+            return Lookup(value, RECOMPUTE, True)
+        # Пересчитывает другой процесс (или кеш недоступен) — отдаем старое
+        _count(STALE)
+        return Lookup(value, STALE, False)
+
+    acquired = _acquire(key)
+    if acquired is None:
+        _count(UNAVAILABLE)
+        return Lookup(None, UNAVAILABLE, False)
+    if acquired:
+        _count(MISS)
+        return Lookup(None, MISS, True)
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        envelope = _get(key)
+        if envelope is not None:
+            if envelope[0] == _NEGATIVE:
+                _count(UNCACHED)
+                return Lookup(None, UNCACHED, False)
+            _count(WAITED)
+            return Lookup(envelope[0], WAITED, False)
+        # Блокировку отпустили, ничего не сохранив (например, пересчет
+        # упал) — ждать больше нечего, пересчитываем сами
+        if _get(_lock_key(key)) is None:
+            acquired = _acquire(key)
+            if acquired is None:
+                _count(UNAVAILABLE)
+                return Lookup(None, UNAVAILABLE, False)
+            if acquired:
+                _count(MISS)
+                return Lookup(None, MISS, True)
+    _count(TIMEOUT)
+    return Lookup(None, TIMEOUT, False)
+
+
+def must_compute(result):
+    return result.state in (MISS, RECOMPUTE, TIMEOUT, UNCACHED, UNAVAILABLE)
+
+
+def store(key, value, ttl, delta=0.0, stale_ttl=STALE_TTL):
+    """Сохраняет значение: свежее ttl секунд, еще stale_ttl — как старое"""
+    _set(key, (value, delta, time.time() + ttl), ttl + stale_ttl)
+
+
+def store_negative(key, ttl=NEGATIVE_TTL):
+    """
+    Помечает key как некешируемый на ttl секунд: ожидающие запросы сразу
+    считают сами, а не ждут значения, которого не будет
+    """
+    _set(key, (_NEGATIVE, 0.0, time.time() + ttl), ttl)
+
+
+def get_or_set(key, compute, ttl, stale_ttl=STALE_TTL, beta=BETA):
+    """Значение key из кеша; compute() вызывается не более чем в одном процессе сразу"""
+    result = lookup(key, beta=beta)
+    if not must_compute(result):
+        return result.value
+
+    started = time.monotonic()
+    try:
+        value = compute()
+        store(key, value, ttl, time.monotonic() - started, stale_ttl)
+    finally:
+        if result.locked:
+            release(key)
+    return value
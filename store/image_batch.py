@@ -0,0 +1,170 @@
+"""
+Пакетная (пере)сборка адаптивных копий изображений каталога.
+
+Используется командой manage.py optimize_images. Конвейер на пачку:
+
+1. оригиналы скачиваются из Supabase параллельно (потоки — это сеть);
+2. декод и ресайз идут в ProcessPoolExecutor (Pillow держит CPU, а в
+   процессах GIL не мешает), JPEG декодируется сразу в уменьшенном
+   масштабе через Image.draft (см. images.build_variants);
+3. копии загружаются параллельно потоками, пути копий пишутся в
+   image_variants одним bulk_update на модель.
+
+Работа группируется по файлу: строки с одним и тем же изображением
+(товар и его фото в галерее) не скачивают и не загружают его повторно.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+from .images import build_variants, storage_location, upload_built_variants
+from .page_cache import invalidate_page_cache
+from .supabase_client import get_bucket
+from .uploads import CACHE_CONTROL
+
+# Ширина копии, которую грузит карточка товара в списке — по ней считаем экономию
+LISTING_WIDTH = 640
+
+
+@dataclass
+class BatchReport:
+    images: int = 0
+    failed: int = 0
+    original_bytes: int = 0
+    variant_bytes: int = 0
+    listing_bytes: int = 0
+    elapsed: float = 0.0
+    errors: list = field(default_factory=list)
+
+    @property
+    def images_per_second(self):
+        return self.images / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_saved(self):
+        """Сколько байт меньше грузит карточка: оригинал против WebP-копии LISTING_WIDTH"""
+        return self.original_bytes - self.listing_bytes
+
+
+def _render(path, data):
+    """Выполняется в дочернем процессе: bytes оригинала -> копии"""
+    from io import BytesIO
+
+    return path, build_variants(BytesIO(data))
+
+
+def collect_targets(models, force=False, limit=None):
+    """[(model, pk, path), ...] изображений, у которых нет актуальных копий"""
+    targets = []
+    for model in models:
+        rows = model.objects.exclude(image__isnull=True).exclude(image='').values_list('pk', 'image', 'image_variants')
+        for pk, path, variants in rows.iterator():
+            if force or (variants or {}).get('path') != path:
+                targets.append((model, pk, path))
+                if limit and len(targets) >= limit:
+                    return targets
+    return targets
+
+
+def _download(bucket, path):
+    return bucket.download(path)
+
+
+def _group_by_file(targets):
+    """
+    {(bucket, путь внутри bucket): [(model, pk, image), ...]} в порядке targets.
+
+    Один файл может быть у нескольких строк (товар и его фото в галерее):
+    он скачивается, режется и загружается один раз, а копии записываются в
+    каждую строку. У Category bucket — часть значения image.
+    """
+    files = {}
+    for model, pk, image in targets:
+        files.setdefault(storage_location(model, image), []).append((model, pk, image))
+    return files
+
+
+def _get_bucket(name, buckets):
+    if name not in buckets:
+        buckets[name] = get_bucket(name)
+    return buckets[name]
+
+
+def optimize_images(targets, processes=None, threads=8, batch_size=32, progress=None):
+    """
+    Строит и загружает копии для targets (см. collect_targets).
+
+    Возвращает BatchReport со скоростью и объемами (images и failed — в
+    строках, байты — по файлам). progress(done, total) вызывается после
+    каждой пачки, в строках.
+    """
+    buckets = {}
+    report = BatchReport()
+    started = time.perf_counter()
+    files = list(_group_by_file(targets).items())
+    done = 0
+
+    def fail(rows, stage, error):
+        report.failed += len(rows)
+        report.errors.append((rows[0][2], f'{stage}: {type(error).__name__}: {error}'))
+
+    with ProcessPoolExecutor(max_workers=processes) as cpu_pool, ThreadPoolExecutor(max_workers=threads) as io_pool:
+        for offset in range(0, len(files), batch_size):
+            batch = dict(files[offset:offset + batch_size])
+
+            downloads = {
+                io_pool.submit(_download, _get_bucket(bucket, buckets), path): (bucket, path)
+                for bucket, path in batch
+            }
+            renders = {}
+            for future in as_completed(downloads):
+                location = downloads[future]
+                try:
+                    data = future.result()
+                except Exception as e:
+                    fail(batch[location], 'download', e)
+                    continue
+                report.original_bytes += len(data)
+                renders[cpu_pool.submit(_render, location[1], data)] = location
+
+            uploads = {}
+            for future in as_completed(renders):
+                location = renders[future]
+                try:
+                    _, variants = future.result()
+                except Exception as e:
+                    fail(batch[location], 'render', e)
+                    continue
+                report.variant_bytes += sum(len(data) for _, _, _, data in variants)
+                listing = [data for width, ext, _, data in variants if ext == 'webp' and width <= LISTING_WIDTH]
+                report.listing_bytes += max((len(data) for data in listing), default=0)
+                bucket, path = location
+                uploads[io_pool.submit(
+                    upload_built_variants, _get_bucket(bucket, buckets), variants, path, CACHE_CONTROL,
+                )] = location
+
+            updates = {}
+            for future in as_completed(uploads):
+                location = uploads[future]
+                try:
+                    value = future.result()
+                except Exception as e:
+                    fail(batch[location], 'upload', e)
+                    continue
+                for model, pk, image in batch[location]:
+                    # В image_variants — значение поля image целиком (с bucket у
+                    # Category), с ним сравнивают images.variant_urls и collect_targets
+                    updates.setdefault(model, []).append(model(pk=pk, image_variants=dict(value, path=image)))
+                    report.images += 1
+
+            for model, objects in updates.items():
+                model.objects.bulk_update(objects, ['image_variants'])
+
+            done += sum(len(rows) for rows in batch.values())
+            if progress:
+                progress(done, len(targets))
+
+    if report.images:
+        invalidate_page_cache()
+    report.elapsed = time.perf_counter() - started
+    return report
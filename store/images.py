@@ -0,0 +1,153 @@
+"""
+Адаптивные копии изображений (derivatives).
+
+После загрузки оригинала воркер очереди (store/uploads.py) делает копии
+фиксированной ширины в WebP и JPEG и кладет их рядом с оригиналом:
+
+    products/gallery/photo.jpg -> products/gallery/photo_w320.webp,
+                                  products/gallery/photo_w320.jpg, ...
+
+Какие ширины есть, записывается в поле image_variants объекта вместе с путем
+оригинала — если путь потом поменяют вручную, старые копии не используются.
+Шаблоны получают srcset через теги из templatetags/store_images.py.
+"""
+import os
+from io import BytesIO
+
+WIDTHS = (160, 320, 640, 1200)
+# Расширение файла, формат Pillow, content-type, параметры сохранения
+FORMATS = (
+    ('webp', 'WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+DEFAULT_SIZES = '(max-width: 576px) 100vw, (max-width: 992px) 50vw, 25vw'
+# Модели, у которых bucket входит в значение поля image ("bucket/путь"):
+# Category.get_image_url строит .../public/{image}, а у товаров и галереи
+# bucket всегда один (.../public/products/{image})
+BUCKET_IN_PATH = {'store.category'}
+
+
+def variant_path(path, width, ext):
+    """Путь копии шириной width рядом с оригиналом"""
+    root, _ = os.path.splitext(path)
+    return f'{root}_w{width}.{ext}'
+
+
+def storage_location(model, image):
+    """
+    (bucket, путь внутри bucket) для значения поля image модели model
+    (класса или объекта); bucket None — bucket по умолчанию.
+    """
+    if model._meta.label_lower in BUCKET_IN_PATH:
+        bucket, _, path = (image or '').partition('/')
+        return bucket or None, path
+    return None, image
+
+
+def variant_paths(obj):
+    """
+    Пути всех копий изображения объекта внутри bucket (для удаления вместе
+    с оригиналом); копии лежат в том же bucket, что и оригинал
+    """
+    variants = getattr(obj, 'image_variants', None) or {}
+    if not variants.get('path'):
+        return []
+    _, path = storage_location(obj, variants['path'])
+    return [variant_path(path, width, ext) for width in variants.get('widths', []) for ext, _, _, _ in FORMATS]
+
+
+def _open_rgb(source, max_width=None):
+    from PIL import Image, ImageOps
+
+    image = Image.open(source)
+    if max_width and image.format == 'JPEG':
+        # JPEG умеет декодироваться сразу в 1/2, 1/4, 1/8 размера — не тратим
+        # время на полный декод 6000px снимка, если нужно не больше max_width
+        # (квадрат — на случай поворота по EXIF)
+        image.draft('RGB', (max_width, max_width))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'L'):
+        # Прозрачность заливаем белым — JPEG ее не поддерживает
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        image = background
+    return image.convert('RGB')
+
+
+def build_variants(source, widths=WIDTHS):
+    """
+    Делает копии изображения source (путь или файл) нужных ширин.
+
+    Возвращает список (ширина, расширение, content-type, bytes). Больше
+    оригинала не увеличиваем: ширины шире исходника пропускаются (самая
+    маленькая делается всегда).
+    """
+    from PIL import Image
+
+    image = _open_rgb(source, max_width=max(widths))
+    fitting = [width for width in sorted(widths) if width <= image.width] or [min(widths)]
+
+    variants = []
+    # От большей к меньшей: каждую следующую уменьшаем из предыдущей — быстрее
+    current = image
+    for width in reversed(fitting):
+        if current.width > width:
+            height = max(1, round(current.height * width / current.width))
+            current = current.resize((width, height), Image.Resampling.LANCZOS)
+        for ext, pil_format, mime_type, params in FORMATS:
+            output = BytesIO()
+            current.save(output, format=pil_format, **params)
+            variants.append((width, ext, mime_type, output.getvalue()))
+    return variants
+
+
+def upload_variants(bucket, source, path, cache_control):
+    """Загружает копии в bucket рядом с path; возвращает значение для image_variants"""
+    return upload_built_variants(bucket, build_variants(source), path, cache_control)
+
+
+def upload_built_variants(bucket, variants, path, cache_control):
+    """То же для уже готового результата build_variants"""
+    from .metrics import observe_upload
+
+    for width, ext, mime_type, data in variants:
+        with observe_upload('variant', len(data)):
+            bucket.upload(variant_path(path, width, ext), data, {
+                'content-type': mime_type,
+                'cache-control': cache_control,
+                'upsert': 'true',
+            })
+    return {'path': path, 'widths': sorted({width for width, _, _, _ in variants})}
+
+
+def _original_url(obj):
+    getter = getattr(obj, 'get_main_image', None) or getattr(obj, 'get_image_url', None)
+    return getter() if getter else None
+
+
+def variant_urls(obj, ext):
+    """[(url, ширина), ...] копий в формате ext или [] если копий нет"""
+    variants = getattr(obj, 'image_variants', None) or {}
+    path = getattr(obj, 'image', None)
+    if not path or variants.get('path') != path:
+        return []
+
+    url = _original_url(obj)
+    if not url or not url.endswith(path):
+        return []
+    # URL копии отличается от URL оригинала только концом (путем файла)
+    base = url[:-len(path)]
+    return [(base + variant_path(path, width, ext), width) for width in variants.get('widths', [])]
+
+
+def srcset(obj, ext='webp'):
+    """Значение атрибута srcset ("url 160w, url 320w, ...") или пустая строка"""
+    return ', '.join(f'{url} {width}w' for url, width in variant_urls(obj, ext))
+
+
+def thumbnail_url(obj, min_width=160):
+    """URL самой маленькой JPEG-копии не уже min_width, иначе оригинал"""
+    for url, width in variant_urls(obj, 'jpg'):
+        if width >= min_width:
+            return url
+    return _original_url(obj)
@@ -0,0 +1,84 @@
+"""
+Замер накладных расходов на соединение с базой в расчете на запрос.
+
+Цикл запроса Django воспроизводится как есть: close_old_connections() на
+request_started/request_finished, затем несколько запросов к базе. Сравниваются
+два режима:
+
+* без пула — CONN_MAX_AGE=0, новое соединение (и TLS) на каждый запрос;
+* с пулом — CONN_MAX_AGE из настроек и CONN_HEALTH_CHECKS.
+
+Локальный стенд вместо Supabase: Postgres и pgbouncer в режиме
+pool_mode=transaction, например
+
+    DB_HOST=127.0.0.1 DB_PORT=6432 DB_NAME=store DB_USER=store \\
+    DB_PASSWORD=... DB_SSLMODE=disable python manage.py bench_db_connections
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время запроса с новым соединением к базе и с постоянным'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Сколько запросов имитировать в каждом режиме')
+        parser.add_argument('--queries', type=int, default=3, help='Сколько SQL-запросов выполняет один запрос')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def _run(self, connection, conn_max_age, requests, queries):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+        timings = []
+        connects = 0
+
+        for _ in range(requests):
+            started = time.perf_counter()
+            close_old_connections()  # request_started
+            if connection.connection is None:
+                connects += 1
+            with connection.cursor() as cursor:
+                for _ in range(queries):
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+            close_old_connections()  # request_finished
+            timings.append((time.perf_counter() - started) * 1000)
+
+        connection.close()
+        timings.sort()
+        return {
+            'mean': statistics.fmean(timings),
+            'p50': timings[len(timings) // 2],
+            'p95': timings[int(len(timings) * 0.95) - 1],
+            'connects': connects,
+        }
+
+    def _report(self, label, result):
+        self.stdout.write(
+            f"{label:<12} mean {result['mean']:8.2f} мс   p50 {result['p50']:8.2f} мс   "
+            f"p95 {result['p95']:8.2f} мс   новых соединений: {result['connects']}"
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        settings_dict = connection.settings_dict
+        original_max_age = settings_dict['CONN_MAX_AGE']
+        pooled_max_age = original_max_age or 300
+
+        self.stdout.write(
+            f"База: {settings_dict.get('HOST') or settings_dict['NAME']}:{settings_dict.get('PORT') or '-'}, "
+            f"запросов: {options['requests']}, SQL на запрос: {options['queries']}"
+        )
+        try:
+            before = self._run(connection, 0, options['requests'], options['queries'])
+            after = self._run(connection, pooled_max_age, options['requests'], options['queries'])
+        finally:
+            settings_dict['CONN_MAX_AGE'] = original_max_age
+
+        self._report('без пула', before)
+        self._report('с пулом', after)
+        overhead = before['mean'] - after['mean']
+        self.stdout.write(self.style.SUCCESS(f'Экономия на соединении: {overhead:.2f} мс на запрос'))
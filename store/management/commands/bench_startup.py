@@ -0,0 +1,84 @@
+"""
+Замер времени старта: загрузка воркера gunicorn и запуск manage.py.
+
+Каждый замер — отдельный чистый процесс Python (как новый воркер или вызов
+команды), поэтому кеш импортов не мешает. Воркер: импорт
+construction_store.wsgi, как у gunicorn (WSGI-приложение и warm_up() —
+индекс подсказок из базы), и загрузка URLconf (импорт всех views).
+Команда: manage.py check. Дополнительно видно, какие тяжелые SDK загрузились при старте — они должны
+импортироваться только при первом использовании.
+
+    python manage.py bench_startup
+    python manage.py bench_startup --runs 20
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Модули, которых не должно быть в процессе сразу после старта
+HEAVY_MODULES = ('supabase', 'PIL', 'httpx', 'storage3', 'postgrest')
+
+WORKER_SCRIPT = f'''
+import json, sys, time
+started = time.perf_counter()
+# Как воркер gunicorn: модуль wsgi проекта, включая warm_up()
+import construction_store.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Меряет время загрузки воркера и запуска manage.py, ищет тяжелые импорты при старте'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10, help='Сколько процессов запускать на замер')
+        parser.add_argument('--strict', action='store_true',
+                            help='Ошибка, если тяжелые SDK загружаются при старте')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'construction_store.settings'))
+        cwd = str(settings.BASE_DIR)
+
+        worker, heavy = [], set()
+        for _ in range(options['runs']):
+            output = subprocess.run(
+                [sys.executable, '-c', WORKER_SCRIPT], env=env, cwd=cwd,
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            worker.append(result['seconds'])
+            heavy.update(result['heavy'])
+
+        command = []
+        for _ in range(options['runs']):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, 'manage.py', 'check'], env=env, cwd=cwd, capture_output=True, check=True)
+            command.append(time.perf_counter() - started)
+
+        self._report('воркер (WSGI + URLconf)', worker)
+        self._report('manage.py check', command)
+
+        if heavy:
+            message = 'Загружаются при старте: ' + ', '.join(sorted(heavy))
+            if options['strict']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('Тяжелые SDK при старте не загружаются'))
+
+    def _report(self, name, timings):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'{name}: медиана {statistics.median(timings) * 1000:.0f} мс, '
+            f'p95 {p95 * 1000:.0f} мс, мин {timings[0] * 1000:.0f} мс'
+        )
@@ -0,0 +1,118 @@
+"""
+Замер страниц витрины на синтетическом каталоге с проверкой регрессий.
+
+Команда создает отдельную тестовую базу (как manage.py test — рабочая база
+не трогается), подменяет кеш и Redis-корзину, заливает каталог
+(store/benchmark.py) и меряет страницы.
+Результат сравнивается с baseline-файлом; если число SQL-запросов выросло
+или p95/память ухудшились больше порога, команда завершается с ошибкой —
+ее можно запускать в CI. Новый baseline записывается с --update-baseline:
+
+    python manage.py bench_storefront --update-baseline
+    python manage.py bench_storefront --latency-threshold 0.5
+
+Baseline (benchmarks/storefront.json) лежит в репозитории. Число запросов
+от машины не зависит, а время — зависит: на CI с другим железом baseline
+стоит перезаписать один раз с --update-baseline.
+"""
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from store.benchmark import LATENCY_SLACK_MS, compare, isolated_services, measure, scenarios, seed_catalog
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'storefront.json')
+
+
+class Command(BaseCommand):
+    help = 'Меряет SQL-запросы, время ответа и память страниц витрины и сравнивает с baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--categories', type=int, default=100)
+        parser.add_argument('--promotions', type=int, default=500)
+        parser.add_argument('--gallery', type=int, default=3, help='Изображений в галерее товара')
+        parser.add_argument('--iterations', type=int, default=30, help='Запросов на страницу')
+        parser.add_argument('--only', nargs='+', help='Мерить только эти страницы')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='JSON с эталонными результатами')
+        parser.add_argument('--update-baseline', action='store_true', help='Записать результаты как baseline')
+        parser.add_argument('--max-query-increase', type=int, default=0,
+                            help='Сколько лишних SQL-запросов допускается')
+        parser.add_argument('--latency-threshold', type=float, default=0.25,
+                            help='Допустимый рост p95 (0.25 = +25%%)')
+        parser.add_argument('--latency-slack', type=float, default=LATENCY_SLACK_MS,
+                            help='Рост p95 меньше этого (мс) не считается регрессией')
+        parser.add_argument('--memory-threshold', type=float, default=0.25,
+                            help='Допустимый рост пика памяти (0.25 = +25%%)')
+        parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую базу после замера')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            with isolated_services():
+                results = self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self._report(results)
+        self._check(results, options)
+
+    def _run(self, options):
+        from store.models import Product
+
+        if not Product.objects.exists():
+            self.stdout.write('🌱 Заполняем тестовый каталог...')
+            seed_catalog(
+                products=options['products'],
+                categories=options['categories'],
+                promotions=options['promotions'],
+                gallery=options['gallery'],
+            )
+
+        results = {}
+        for name, prepare, request in scenarios():
+            if options['only'] and name not in options['only']:
+                continue
+            results[name] = measure(prepare, request, iterations=options['iterations'])
+        return results
+
+    def _report(self, results):
+        self.stdout.write(f"{'страница':<16}{'код':>5}{'SQL':>6}{'p50, мс':>10}{'p95, мс':>10}{'память, КБ':>13}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<16}{result['status']:>5}{result['queries']:>6}"
+                f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['peak_kb']:>13.1f}"
+            )
+
+    def _check(self, results, options):
+        path = options['baseline']
+        if options['update_baseline']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Baseline записан: {path}'))
+            return
+
+        if not os.path.exists(path):
+            self.stdout.write(self.style.WARNING(f'Baseline не найден ({path}), сравнивать не с чем'))
+            return
+
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(
+            results, baseline,
+            max_query_increase=options['max_query_increase'],
+            latency_threshold=options['latency_threshold'],
+            latency_slack_ms=options['latency_slack'],
+            memory_threshold=options['memory_threshold'],
+        )
+        if regressions:
+            raise CommandError('Регрессия производительности:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
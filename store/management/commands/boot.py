@@ -0,0 +1,113 @@
+"""
+Разовая подготовка базы при деплое (вызывается из build.sh после migrate).
+
+Раньше то же делал поток из settings.py в каждом воркере gunicorn: N
+воркеров одновременно сбрасывали пароль и могли N раз загрузить фикстуры.
+Команду можно запускать сколько угодно раз: данные загружаются, только если
+каталог пуст, а на Postgres параллельные запуски ждут друг друга
+(advisory lock), так что фикстуры не загрузятся дважды.
+
+    DJANGO_ADMIN_PASSWORD=... python manage.py boot
+    python manage.py boot --skip-fixtures
+    python manage.py boot --export export   # выгрузка manage.py export_store
+
+Пароль суперпользователя берется из DJANGO_ADMIN_PASSWORD (логин и почта —
+DJANGO_ADMIN_USERNAME, DJANGO_ADMIN_EMAIL). Если переменная не задана,
+суперпользователь не создается и пароль существующего не меняется.
+"""
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from store.export import manifest_fixtures
+from store.models import Category, Product
+
+FIXTURES = ['unicode_fixed_data.json', 'store_data.json', 'data.json']
+# Папка manage.py export_store; если в ней есть manifest.json, грузится она
+EXPORT_DIR = 'export'
+# Ключ pg_advisory_xact_lock — любой постоянный номер
+BOOT_LOCK_ID = 7302418
+
+
+class Command(BaseCommand):
+    help = 'Создает суперпользователя и загружает начальные данные (один раз за деплой)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-fixtures', action='store_true', help='Не загружать данные магазина')
+        parser.add_argument('--export', default=EXPORT_DIR,
+                            help='Папка выгрузки export_store (загружается вместо FIXTURES, если есть)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_xact_lock(%s)', [BOOT_LOCK_ID])
+
+            self._ensure_admin()
+            if not options['skip_fixtures']:
+                self._load_fixtures(options['export'])
+
+        User = get_user_model()
+        self.stdout.write('📊 ИТОГО В БАЗЕ:')
+        self.stdout.write(f'   Категорий: {Category.objects.count()}')
+        self.stdout.write(f'   Товаров: {Product.objects.count()}')
+        self.stdout.write(f'   Пользователей: {User.objects.count()}')
+
+    def _ensure_admin(self):
+        username = os.getenv('DJANGO_ADMIN_USERNAME', 'admin')
+        password = os.getenv('DJANGO_ADMIN_PASSWORD')
+        if not password:
+            self.stdout.write('ℹ️ DJANGO_ADMIN_PASSWORD не задан, суперпользователь не меняется')
+            return
+
+        User = get_user_model()
+        user, created = User.objects.get_or_create(
+            username=username,
+            defaults={
+                'email': os.getenv('DJANGO_ADMIN_EMAIL', 'admin@example.com'),
+                'is_staff': True,
+                'is_superuser': True,
+            },
+        )
+        user.set_password(password)
+        user.save(update_fields=['password'] if not created else None)
+        if created:
+            self.stdout.write(self.style.SUCCESS(f'✅ Создан суперпользователь "{username}"'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ Пароль для "{username}" обновлен из DJANGO_ADMIN_PASSWORD'))
+
+    def _load_fixtures(self, export_dir):
+        if Category.objects.exists() and Product.objects.exists():
+            self.stdout.write('ℹ️ Данные магазина уже есть, фикстуры не загружаются')
+            return
+
+        if os.path.exists(os.path.join(export_dir, 'manifest.json')):
+            self._load_export(export_dir)
+            return
+
+        self.stdout.write('📦 Загружаю данные магазина...')
+        for fixture in FIXTURES:
+            if not os.path.exists(fixture):
+                continue
+            try:
+                # Savepoint: ошибка в одном файле не ломает транзакцию команды
+                with transaction.atomic():
+                    call_command('loaddata', fixture, verbosity=0)
+            except Exception as e:
+                self.stderr.write(f'❌ Ошибка загрузки {fixture}: {e}')
+                continue
+            self.stdout.write(self.style.SUCCESS(f'✅ Данные загружены из {fixture}'))
+            break
+
+    def _load_export(self, export_dir):
+        try:
+            fixtures = manifest_fixtures(export_dir)
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write(f'📦 Загружаю выгрузку {export_dir} ({len(fixtures)} файлов)...')
+        # Одним вызовом: loaddata сам разрешит ссылки между файлами
+        call_command('loaddata', *fixtures, verbosity=0)
+        self.stdout.write(self.style.SUCCESS(f'✅ Данные загружены из {export_dir}'))
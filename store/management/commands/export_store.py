@@ -0,0 +1,59 @@
+"""
+Потоковая выгрузка данных в фикстуры (замена custom_dump.py).
+
+Память не растет с размером базы: строки пишутся в файлы по чанкам
+(store/export.py). Примеры:
+
+    python manage.py export_store
+    python manage.py export_store store.Product store.ProductImage --format json --no-gzip
+    python manage.py export_store --resume          # продолжить прерванный экспорт
+
+Загрузка в пустую базу — manage.py boot (файлы по порядку из manifest.json):
+
+    python manage.py boot --export export
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from store.export import CHUNK_SIZE, FORMATS, export_store, resolve_models
+
+
+class Command(BaseCommand):
+    help = 'Выгружает данные магазина в NDJSON/JSON (можно gzip) по чанкам, с продолжением после обрыва'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*',
+            help='app или app.Model. По умолчанию — данные магазина без того, что восстанавливается само: '
+                 'contenttypes/Permission (создает migrate), ProductEffectivePrice (rebuild_effective_prices), '
+                 'корзины и очереди Cart, ImageUploadJob, StorageDeleteJob',
+        )
+        parser.add_argument('-e', '--exclude', action='append', default=[], help='Исключить app или app.Model')
+        parser.add_argument('-o', '--output', default='export', help='Папка экспорта')
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument('--no-gzip', action='store_true', help='Не сжимать файлы')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Строк за один запрос к базе')
+        parser.add_argument('--resume', action='store_true', help='Продолжить экспорт в той же папке')
+
+    def handle(self, *args, **options):
+        try:
+            models = resolve_models(options['models'], options['exclude'])
+        except LookupError as e:
+            raise CommandError(e)
+
+        def progress(entry):
+            self.stdout.write(f"   {entry['model']}: {entry['count']}", ending='\r')
+
+        manifest = export_store(
+            options['output'], models,
+            fmt=options['format'],
+            compress=not options['no_gzip'],
+            chunk_size=options['chunk_size'],
+            resume=options['resume'],
+            progress=progress if options['verbosity'] > 0 else None,
+        )
+
+        total = 0
+        for entry in manifest['models']:
+            total += entry['count']
+            self.stdout.write(f"✅ {entry['model']}: {entry['count']} → {entry['file']}")
+        self.stdout.write(self.style.SUCCESS(f"Всего записей: {total} (папка {options['output']})"))
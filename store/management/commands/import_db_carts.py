@@ -0,0 +1,58 @@
+"""
+Перенос корзин из старой таблицы Cart в Redis (один раз после перехода
+на RedisCartBackend). Без переноса покупатели, у которых корзина лежала
+в базе, увидели бы ее пустой.
+
+Количество складывается с тем, что уже есть в Redis; перенесенные строки
+удаляются из таблицы, поэтому повторный запуск ничего не задвоит. При
+недоступном Redis команда ничего не удаляет и завершается без ошибки —
+ее можно оставить в build.sh.
+
+    python manage.py import_db_carts
+"""
+from django.core.management.base import BaseCommand
+
+from store.cart import CartUnavailable, RedisCartBackend, get_cart_backend
+from store.models import Cart
+
+
+class Command(BaseCommand):
+    help = 'Переносит корзины из таблицы Cart в Redis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=1000, help='Строк за один запрос к базе')
+
+    def handle(self, *args, **options):
+        backend = get_cart_backend()
+        if not isinstance(backend, RedisCartBackend):
+            self.stdout.write('ℹ️ Корзины хранятся в базе (CART_BACKEND), переносить нечего')
+            return
+
+        moved = sessions = 0
+        while True:
+            session_keys = list(
+                Cart.objects.order_by('session_key').values_list('session_key', flat=True).distinct()[:options['batch']]
+            )
+            if not session_keys:
+                break
+            rows = Cart.objects.filter(session_key__in=session_keys).values_list('session_key', 'product_id', 'quantity')
+            carts = {}
+            for session_key, product_id, quantity in rows:
+                carts.setdefault(session_key, {})[product_id] = quantity
+
+            for session_key, quantities in carts.items():
+                current = backend.get_lines(session_key)
+                merged = {product_id: quantity + current.get(product_id, 0)
+                          for product_id, quantity in quantities.items()}
+                try:
+                    backend.set_many(session_key, merged)
+                except CartUnavailable:
+                    self.stdout.write(self.style.WARNING(
+                        f'⚠️ Redis недоступен, перенесено {sessions} корзин; запустите команду позже'
+                    ))
+                    return
+                Cart.objects.filter(session_key=session_key).delete()
+                moved += len(quantities)
+                sessions += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Перенесено корзин: {sessions}, строк: {moved}'))
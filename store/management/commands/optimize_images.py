@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+from store.image_batch import collect_targets, optimize_images
+from store.models import Category, Product, ProductImage
+
+MODELS = {
+    'product': Product,
+    'productimage': ProductImage,
+    'category': Category,
+}
+
+
+class Command(BaseCommand):
+    help = 'Пакетно строит адаптивные копии (WebP/JPEG) для изображений каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', choices=sorted(MODELS), default=sorted(MODELS),
+                            help='Какие модели обрабатывать')
+        parser.add_argument('--force', action='store_true', help='Пересобрать копии, даже если они уже есть')
+        parser.add_argument('--processes', type=int, default=None, help='Процессов для ресайза (по умолчанию — по числу CPU)')
+        parser.add_argument('--threads', type=int, default=8, help='Потоков для скачивания и загрузки')
+        parser.add_argument('--batch', type=int, default=32, help='Изображений в одной пачке')
+        parser.add_argument('--limit', type=int, default=None, help='Обработать не больше N изображений')
+
+    def handle(self, *args, **options):
+        targets = collect_targets(
+            [MODELS[name] for name in options['models']],
+            force=options['force'],
+            limit=options['limit'],
+        )
+        if not targets:
+            self.stdout.write(self.style.SUCCESS('Все изображения уже оптимизированы'))
+            return
+
+        self.stdout.write(f'🖼️ Изображений к обработке: {len(targets)}')
+        report = optimize_images(
+            targets,
+            processes=options['processes'],
+            threads=options['threads'],
+            batch_size=options['batch'],
+            progress=lambda done, total: self.stdout.write(f'  {done}/{total}'),
+        )
+
+        for path, error in report.errors:
+            self.stdout.write(self.style.ERROR(f'❌ {path}: {error}'))
+
+        mb = 1024 * 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {report.images}, с ошибкой: {report.failed} '
+            f'за {report.elapsed:.1f} с ({report.images_per_second:.1f} изобр./с)'
+        ))
+        self.stdout.write(
+            f'Оригиналы: {report.original_bytes / mb:.1f} МБ, все копии: {report.variant_bytes / mb:.1f} МБ, '
+            f'карточки ({report.listing_bytes / mb:.1f} МБ) легче оригиналов на {report.bytes_saved / mb:.1f} МБ'
+        )
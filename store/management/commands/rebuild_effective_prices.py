@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.models import refresh_effective_prices, refresh_expired_effective_prices
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает таблицу итоговых цен товаров с учетом акций'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--expired',
+            action='store_true',
+            help='Пересчитать только товары, у которых прошло начало/окончание акции (то же раз в минуту делает manage.py run_upload_worker)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        if options['expired']:
+            count = refresh_expired_effective_prices()
+            label = 'Пересчитано товаров с истекшей границей акции'
+        else:
+            count = refresh_effective_prices()
+            label = 'Записано итоговых цен'
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'{label}: {count} за {elapsed:.2f} с'))
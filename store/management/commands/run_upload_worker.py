@@ -0,0 +1,72 @@
+"""
+Фоновый воркер (Procfile: worker).
+
+* загружает изображения из очереди ImageUploadJob в Supabase (если задан
+  UPLOAD_QUEUE_DIR — общая с веб-процессом папка временных файлов);
+* повторяет неудавшиеся удаления файлов (StorageDeleteJob);
+* раз в --prices-interval секунд пересчитывает итоговые цены товаров, у
+  которых началась или закончилась акция (как rebuild_effective_prices
+  --expired) — без этого цена в каталоге не меняется по окончании акции.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store.deletions import retry_storage_deletes
+from store.models import refresh_expired_effective_prices
+from store.uploads import claim_jobs, process_job
+
+
+class Command(BaseCommand):
+    help = 'Воркер: загрузка изображений в Supabase, повторы удаления файлов, цены по окончании акций'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Обработать готовые задания и выйти')
+        parser.add_argument('--batch', type=int, default=10, help='Сколько заданий забирать за раз')
+        parser.add_argument('--interval', type=float, default=2.0, help='Пауза (с), когда очередь пуста')
+        parser.add_argument('--prices-interval', type=float, default=60.0,
+                            help='Как часто (с) пересчитывать цены товаров с истекшей границей акции')
+
+    def handle(self, *args, **options):
+        # Без общей папки временных файлов воркер их не увидит: загрузки
+        # остаются фоновому потоку веб-процесса (UPLOAD_WORKER не задан)
+        uploads = bool(settings.UPLOAD_QUEUE_DIR)
+        if not uploads:
+            self.stdout.write(self.style.WARNING(
+                '⚠️ UPLOAD_QUEUE_DIR не задан — изображения не загружаются, только удаления файлов и цены'
+            ))
+        self.stdout.write('📤 Воркер загрузки изображений запущен')
+        done = failed = removed = repriced = 0
+        prices_due = 0
+
+        try:
+            while True:
+                close_old_connections()
+                jobs = claim_jobs(options['batch']) if uploads else []
+                for job in jobs:
+                    if process_job(job):
+                        done += 1
+                    else:
+                        failed += 1
+
+                # Файлы, которые не удалось удалить сразу после коммита
+                deleted, _ = retry_storage_deletes()
+                removed += deleted
+
+                if time.monotonic() >= prices_due:
+                    repriced += refresh_expired_effective_prices()
+                    prices_due = time.monotonic() + options['prices_interval']
+
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено: {done}, с ошибкой: {failed}, удалено файлов: {removed}, '
+            f'пересчитано цен: {repriced}'
+        ))
@@ -0,0 +1,92 @@
+"""
+Метрики магазина в формате Prometheus (GET /metrics).
+
+Несколько воркеров gunicorn — несколько процессов со своими счетчиками,
+поэтому prometheus_client работает в multiprocess-режиме: каждый процесс
+пишет значения в файлы папки PROMETHEUS_MULTIPROC_DIR, а /metrics
+складывает их. Папку создает и очищает gunicorn.conf.py при старте;
+воркер загрузок (run_upload_worker), запущенный с той же переменной,
+попадает в общую статистику. Без переменной (runserver) метрики
+считаются в памяти процесса.
+
+Доступ — по токену METRICS_TOKEN (см. metrics_view); если токен не задан,
+/metrics отвечает 403 везде, кроме DEBUG.
+
+Доля попаданий в кеш считается в Prometheus:
+    sum(rate(store_cache_requests_total{state=~"hit|stale|waited"}[5m]))
+      / sum(rate(store_cache_requests_total[5m]))
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+VIEW_LATENCY = Histogram(
+    'store_view_latency_seconds', 'Время ответа view', ['view', 'method'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+CART_ADDS = Counter('store_cart_add_total', 'Добавления товара в корзину')
+CHECKOUTS = Counter('store_checkout_total', 'Попытки оформить заказ', ['result'])
+SEARCHES = Counter('store_search_total', 'Поисковые запросы')
+ZERO_RESULT_SEARCHES = Counter('store_search_zero_results_total', 'Поисковые запросы без результатов')
+CACHE_REQUESTS = Counter('store_cache_requests_total', 'Обращения к горячему кешу (store/hot_cache.py)', ['state'])
+DB_CONNECTIONS = Counter('store_db_connections_opened_total', 'Открытые соединения с базой', ['alias'])
+UPLOAD_LATENCY = Histogram(
+    'store_supabase_upload_seconds', 'Время загрузки файла в Supabase', ['kind'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+UPLOAD_BYTES = Counter('store_supabase_upload_bytes_total', 'Загружено в Supabase, байт', ['kind'])
+
+# Прочие методы считаются как 'other', чтобы не плодить серии
+KNOWN_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+@contextmanager
+def observe_upload(kind, size):
+    """Замеряет загрузку файла размером size байт в Supabase"""
+    started = time.perf_counter()
+    yield
+    UPLOAD_LATENCY.labels(kind).observe(time.perf_counter() - started)
+    UPLOAD_BYTES.labels(kind).inc(size)
+
+
+def _registry():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_view(request):
+    """
+    Метрики всех процессов. Нужен заголовок Authorization: Bearer
+    <METRICS_TOKEN>; без токена /metrics открыт только при DEBUG.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """Гистограмма времени ответа по имени URL"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match and match.view_name else 'unmatched'
+        method = request.method if request.method in KNOWN_METHODS else 'other'
+        VIEW_LATENCY.labels(view, method).observe(time.perf_counter() - started)
+        return response
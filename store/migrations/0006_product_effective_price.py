@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 07:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_alter_productpromotion_options_product_old_price_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductEffectivePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sale_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена со скидкой')),
+                ('discount_percentage', models.DecimalField(decimal_places=1, default=0, max_digits=5, verbose_name='Процент скидки')),
+                ('valid_until', models.DateTimeField(blank=True, db_index=True, help_text='Ближайшее начало или окончание акции, после которого цена устаревает', null=True, verbose_name='Пересчитать после')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='effective_price', to='store.product', verbose_name='Товар')),
+                ('promotion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.promotion', verbose_name='Действующая акция')),
+            ],
+            options={
+                'verbose_name': 'Итоговая цена товара',
+                'verbose_name_plural': 'Итоговые цены товаров',
+                'indexes': [models.Index(fields=['sale_price'], name='store_produ_sale_pr_b58578_idx')],
+            },
+        ),
+    ]
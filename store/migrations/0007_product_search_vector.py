@@ -0,0 +1,65 @@
+# Generated by Django 6.0 on 2026-10-18 07:12
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# SQL копируется сюда, а не импортируется из store.search: миграция должна
+# оставаться неизменной, даже если модуль поиска поменяется.
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('pg_catalog.russian', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('pg_catalog.russian', coalesce(NEW.brand, '')), 'A') ||
+    setweight(to_tsvector('pg_catalog.russian', coalesce(NEW.material, '')), 'B') ||
+    setweight(to_tsvector('pg_catalog.russian', coalesce(NEW.description, '')), 'C')
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    """Триггер, GIN-индекс и заполнение вектора — только для PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(f"""
+        CREATE OR REPLACE FUNCTION store_product_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR_SQL};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+    """)
+    schema_editor.execute("""
+        CREATE TRIGGER store_product_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF name, brand, material, description
+        ON store_product
+        FOR EACH ROW EXECUTE FUNCTION store_product_search_vector_update();
+    """)
+    schema_editor.execute(
+        "CREATE INDEX store_product_search_vector_gin "
+        "ON store_product USING gin (search_vector);"
+    )
+    # Заполняем вектор для существующих товаров (срабатывает триггер)
+    schema_editor.execute("UPDATE store_product SET name = name;")
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute("DROP INDEX IF EXISTS store_product_search_vector_gin;")
+    schema_editor.execute("DROP TRIGGER IF EXISTS store_product_search_vector_trigger ON store_product;")
+    schema_editor.execute("DROP FUNCTION IF EXISTS store_product_search_vector_update();")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 07:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageUploadJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100, verbose_name='Модель')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='ID объекта')),
+                ('field_name', models.CharField(default='image', max_length=50, verbose_name='Поле')),
+                ('path', models.CharField(max_length=500, verbose_name='Путь в Supabase')),
+                ('staged_file', models.CharField(max_length=500, verbose_name='Временный файл')),
+                ('mime_type', models.CharField(default='image/jpeg', max_length=100, verbose_name='Content-Type')),
+                ('save_public_url', models.BooleanField(default=False, help_text='Записать в поле полный URL вместо пути в bucket', verbose_name='Сохранять публичный URL')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Загружается'), ('done', 'Загружено'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=20, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Не раньше')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+            ],
+            options={
+                'verbose_name': 'Загрузка изображения',
+                'verbose_name_plural': 'Очередь загрузки изображений',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='store_image_status_4e1ebd_idx'), models.Index(fields=['model_label', 'object_id'], name='store_image_model_l_44d747_idx')],
+            },
+        ),
+    ]
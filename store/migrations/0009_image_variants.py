@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_image_upload_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Заполняется воркером загрузки: путь оригинала и ширины копий (store/images.py)', verbose_name='Адаптивные копии'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Заполняется воркером загрузки: путь оригинала и ширины копий (store/images.py)', verbose_name='Адаптивные копии'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Заполняется воркером загрузки: путь оригинала и ширины копий (store/images.py)', verbose_name='Адаптивные копии'),
+        ),
+    ]
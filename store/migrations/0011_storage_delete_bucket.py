@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_storage_delete_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storagedeletejob',
+            name='bucket',
+            field=models.CharField(blank=True, help_text='Пусто — bucket по умолчанию', max_length=100, verbose_name='Bucket'),
+        ),
+    ]
@@ -3,10 +3,12 @@ from django.core.validators import MinValueValidator
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
+from django.contrib.postgres.search import SearchVectorField
 
-from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_delete, post_delete
+from django.db.backends.signals import connection_created
 from django.dispatch import receiver
-from supabase import create_client
+from .images import storage_location, variant_paths
 from django.conf import settings
 import os
 
@@ -19,6 +21,10 @@ class Category(models.Model):
     image = models.CharField('Изображение (Supabase)', max_length=500, blank=True, null=True)
     image_file = models.ImageField(upload_to='categories/', verbose_name='Изображение',blank=True,  null=True)
     image_url = models.URLField('URL изображения', blank=True)
+    image_variants = models.JSONField(
+        'Адаптивные копии', default=dict, blank=True, editable=False,
+        help_text='Заполняется воркером загрузки: путь оригинала и ширины копий (store/images.py)'
+    )
 
     class Meta:
         verbose_name = 'Категория'
@@ -87,6 +93,10 @@ class Product(models.Model):
     image_file = models.ImageField(upload_to='products/gallery/', verbose_name='Изображение',blank=True,  null=True)
 
     image_url = models.URLField('URL изображения', blank=True, help_text='Или укажите внешний URL')
+    image_variants = models.JSONField(
+        'Адаптивные копии', default=dict, blank=True, editable=False,
+        help_text='Заполняется воркером загрузки: путь оригинала и ширины копий (store/images.py)'
+    )
 
     # Характеристики товара
     weight = models.DecimalField(max_digits=10, decimal_places=3, null=True,
@@ -95,6 +105,9 @@ class Product(models.Model):
     color = models.CharField(max_length=50, blank=True, verbose_name='Цвет')
     material = models.CharField(max_length=100, blank=True, verbose_name='Материал')
 
+    # Поисковый вектор (PostgreSQL): заполняется триггером БД из миграции 0007
+    search_vector = SearchVectorField(null=True, editable=False)
+
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
@@ -125,21 +138,19 @@ class Product(models.Model):
     @property
     def has_promotion(self):
         """Проверка, есть ли у товара активная акция"""
-        try:
-            return self.product_promotions.filter(
-                promotion__is_active=True,
-                promotion__start_date__isnull=False,
-                promotion__end_date__isnull=False
-            ).filter(
-                models.Q(promotion__start_date__lte=timezone.now()) &
-                models.Q(promotion__end_date__gte=timezone.now())
-            ).exists()
-        except:
-            return False
+        return self.current_promotion is not None
 
     @property
     def current_promotion(self):
         """Получить текущую акцию для товара"""
+        # Акция уже подставлена attach_promotions() или прошлым обращением
+        if '_resolved_promotion' in self.__dict__:
+            return self._resolved_promotion
+
+        # У несохраненного товара акций быть не может
+        if self.pk is None:
+            return None
+
         try:
             product_promotion = self.product_promotions.filter(
                 promotion__is_active=True,
@@ -148,13 +159,16 @@ class Product(models.Model):
             ).filter(
                 models.Q(promotion__start_date__lte=timezone.now()) &
                 models.Q(promotion__end_date__gte=timezone.now())
-            ).order_by('-priority').first()
+            ).select_related('promotion').order_by('-priority', '-created_at').first()
 
-            return product_promotion.promotion if product_promotion else None
+            promotion = product_promotion.promotion if product_promotion else None
         except Exception as e:
             print(f"Error getting current promotion: {e}")
             return None
 
+        self._resolved_promotion = promotion
+        return promotion
+
     @property
     def discount_percentage(self):
         """Получить процент скидки"""
@@ -251,6 +265,10 @@ class ProductImage(models.Model):
     image = models.CharField('Изображение (Supabase)', max_length=500, blank=True, null=True)
     image_file = models.ImageField(upload_to='products/gallery/', verbose_name='Изображение',blank=True,  null=True)
     image_url = models.URLField('URL изображения', blank=True)
+    image_variants = models.JSONField(
+        'Адаптивные копии', default=dict, blank=True, editable=False,
+        help_text='Заполняется воркером загрузки: путь оригинала и ширины копий (store/images.py)'
+    )
     alt_text = models.CharField(max_length=200, blank=True, verbose_name='Альтернативный текст')
     order = models.PositiveIntegerField(default=0, verbose_name='Порядок')
 
@@ -404,10 +422,14 @@ class UserProfile(models.Model):
         return f"Профиль {self.user.username}"
 
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import datetime
+from decimal import Decimal
+import threading
+import weakref
 
 
 class Promotion(models.Model):
@@ -621,55 +643,407 @@ class ProductPromotion(models.Model):
         return self.promotion.is_current
 
 
+def attach_promotions(products):
+    """
+    Подставляет текущие акции сразу для списка товаров одним запросом.
+
+    Принимает queryset или список товаров, возвращает список. После вызова
+    has_promotion, current_promotion, sale_price, promotion_price и т.д.
+    больше не обращаются к базе.
+    """
+    products = list(products)
+    if not products:
+        return products
+
+    now = timezone.now()
+    product_promotions = ProductPromotion.objects.filter(
+        product_id__in={product.pk for product in products},
+        promotion__is_active=True,
+        promotion__start_date__lte=now,
+        promotion__end_date__gte=now,
+    ).select_related('promotion').order_by('product_id', '-priority', '-created_at')
+
+    # Побеждает акция с наибольшим приоритетом (первая для каждого товара)
+    winners = {}
+    for product_promotion in product_promotions:
+        winners.setdefault(product_promotion.product_id, product_promotion.promotion)
+
+    for product in products:
+        product._resolved_promotion = winners.get(product.pk)
+
+    return products
+
+
+class ProductEffectivePrice(models.Model):
+    """Итоговая цена товара с учетом акций (денормализация для сортировки и фильтров в SQL)"""
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='effective_price',
+        verbose_name="Товар"
+    )
+    promotion = models.ForeignKey(
+        Promotion,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Действующая акция"
+    )
+    sale_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена со скидкой")
+    discount_percentage = models.DecimalField(
+        max_digits=5,
+        decimal_places=1,
+        default=0,
+        verbose_name="Процент скидки"
+    )
+    valid_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name="Пересчитать после",
+        help_text="Ближайшее начало или окончание акции, после которого цена устаревает"
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Итоговая цена товара"
+        verbose_name_plural = "Итоговые цены товаров"
+        indexes = [
+            models.Index(fields=['sale_price']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.sale_price}"
+
+
+def refresh_effective_prices(product_ids=None):
+    """
+    Пересчитывает таблицу итоговых цен.
+
+    Без product_ids перестраивает таблицу целиком, иначе только для
+    указанных товаров. Строки хранятся лишь для товаров, у которых есть
+    текущая или будущая акция; для остальных итоговая цена равна price.
+    Возвращает количество записанных строк.
+    """
+    now = timezone.now()
+    links = ProductPromotion.objects.filter(
+        promotion__is_active=True,
+        promotion__start_date__isnull=False,
+        promotion__end_date__gte=now,
+    ).select_related('product', 'promotion').order_by('product_id', '-priority', '-created_at')
+    if product_ids is not None:
+        product_ids = set(product_ids)
+        links = links.filter(product_id__in=product_ids)
+
+    products = {}
+    winners = {}
+    boundaries = {}
+    for link in links:
+        promotion = link.promotion
+        products.setdefault(link.product_id, link.product)
+        if promotion.start_date <= now:
+            winners.setdefault(link.product_id, promotion)
+            boundary = promotion.end_date
+        else:
+            boundary = promotion.start_date
+
+        # Цена меняется на ближайшей границе любой из акций товара
+        current = boundaries.get(link.product_id)
+        if current is None or boundary < current:
+            boundaries[link.product_id] = boundary
+
+    rows = []
+    for product_id, product in products.items():
+        promotion = winners.get(product_id)
+        product._resolved_promotion = promotion
+        rows.append(ProductEffectivePrice(
+            product_id=product_id,
+            promotion=promotion,
+            sale_price=product.promotion_price,
+            discount_percentage=Decimal(str(product.discount_percentage)),
+            valid_until=boundaries[product_id],
+        ))
+
+    with transaction.atomic():
+        stale = ProductEffectivePrice.objects.all()
+        if product_ids is not None:
+            stale = stale.filter(product_id__in=product_ids)
+        stale.delete()
+        ProductEffectivePrice.objects.bulk_create(rows)
+
+    return len(rows)
+
+
+def refresh_expired_effective_prices():
+    """Пересчитывает цены товаров, у которых прошла граница начала/окончания акции"""
+    product_ids = list(
+        ProductEffectivePrice.objects.filter(valid_until__lte=timezone.now())
+        .values_list('product_id', flat=True)
+    )
+    if not product_ids:
+        return 0
+    refresh_effective_prices(product_ids)
+    return len(product_ids)
+
+
+def annotate_sale_price(queryset):
+    """Добавляет к queryset товаров поле effective_sale_price для сортировки и фильтров"""
+    if 'effective_sale_price' in queryset.query.annotations:
+        return queryset
+    return queryset.annotate(
+        effective_sale_price=Coalesce('effective_price__sale_price', 'price')
+    )
+
+
+_price_refresh_local = threading.local()
+
+
+class _PriceRefresh(set):
+    """Товары, изменившиеся в одном savepoint; сам является on_commit-колбэком"""
+
+    def __init__(self, savepoint):
+        super().__init__()
+        self.savepoint = savepoint
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        refresh_effective_prices(self)
+
+
+def schedule_effective_price_refresh(product_ids):
+    """
+    Откладывает пересчет цен до коммита транзакции, объединяя товары в один пересчет.
+
+    Товары копятся в пачке текущего savepoint, которая сама зарегистрирована
+    в on_commit: другие потоки и соединения ее не видят, а при откате
+    Django выбрасывает пачку вместе с колбэком.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        refresh_effective_prices(product_ids)
+        return
+
+    savepoint = tuple(connection.savepoint_ids)
+    ref = getattr(_price_refresh_local, 'batch', None)
+    batch = ref() if ref else None
+    if batch is None or batch.done or batch.savepoint != savepoint:
+        batch = _PriceRefresh(savepoint)
+        transaction.on_commit(batch)
+        # Слабая ссылка: выброшенная при откате пачка не переживет колбэк
+        _price_refresh_local.batch = weakref.ref(batch)
+    batch.update(product_ids)
+
+
+class ImageUploadJob(models.Model):
+    """Задание фоновой загрузки изображения в Supabase (см. store/uploads.py)"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Загружается'),
+        (STATUS_DONE, 'Загружено'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    model_label = models.CharField(max_length=100, verbose_name='Модель')
+    object_id = models.PositiveBigIntegerField(verbose_name='ID объекта')
+    field_name = models.CharField(max_length=50, default='image', verbose_name='Поле')
+    path = models.CharField(max_length=500, verbose_name='Путь в Supabase')
+    staged_file = models.CharField(max_length=500, verbose_name='Временный файл')
+    mime_type = models.CharField(max_length=100, default='image/jpeg', verbose_name='Content-Type')
+    save_public_url = models.BooleanField(
+        default=False,
+        verbose_name='Сохранять публичный URL',
+        help_text='Записать в поле полный URL вместо пути в bucket'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES,
+                              default=STATUS_PENDING, db_index=True, verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    run_after = models.DateTimeField(default=timezone.now, verbose_name='Не раньше')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершено')
+
+    class Meta:
+        verbose_name = 'Загрузка изображения'
+        verbose_name_plural = 'Очередь загрузки изображений'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['model_label', 'object_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.model_label}#{self.object_id}.{self.field_name} → {self.path}"
+
+
+class StorageDeleteJob(models.Model):
+    """Файл Supabase, который не удалось удалить сразу (см. store/deletions.py)"""
+    bucket = models.CharField(max_length=100, blank=True, verbose_name='Bucket',
+                              help_text='Пусто — bucket по умолчанию')
+    path = models.CharField(max_length=500, verbose_name='Путь в Supabase')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    run_after = models.DateTimeField(default=timezone.now, db_index=True, verbose_name='Не раньше')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+
+    class Meta:
+        verbose_name = 'Удаление файла'
+        verbose_name_plural = 'Очередь удаления файлов'
+        ordering = ['run_after']
+
+    def __str__(self):
+        return f'{self.bucket}/{self.path}' if self.bucket else self.path
+
+
 # Сигналы для автоматического создания профиля при создании пользователя
 # @receiver(post_save, sender=User)
 # def create_user_profile(sender, instance, created, **kwargs):
 #     if created:
 #         UserProfile.objects.create(user=instance)
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    # При loaddata профиль придет из той же выгрузки
+    if raw:
+        return
     UserProfile.objects.update_or_create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
     try:
         instance.userprofile.save()
     except UserProfile.DoesNotExist:
         UserProfile.objects.create(user=instance)
 
 
+@receiver(connection_created)
+def count_db_connection(sender, connection, **kwargs):
+    """Метрика открытых соединений с базой — видно, переиспользуются ли они"""
+    from .metrics import DB_CONNECTIONS
+    DB_CONNECTIONS.labels(connection.alias).inc()
+
+
 @receiver(pre_delete, sender=Product)
 def delete_product_images(sender, instance, **kwargs):
     """Удаляет изображения из Supabase при удалении товара"""
-    delete_from_supabase(instance.image)
-
-    # Удаляем все изображения галереи
-    for product_image in instance.images.all():
-        delete_from_supabase(product_image.image)
-        # Локальные файлы удалятся автоматически Django
+    # Галерею удалит сигнал ProductImage — Django удаляет ее каскадом
+    delete_image_files(instance)
 
 
 @receiver(pre_delete, sender=ProductImage)
 def delete_productimage_images(sender, instance, **kwargs):
     """Удаляет изображение из Supabase при удалении ProductImage"""
-    delete_from_supabase(instance.image)
+    delete_image_files(instance)
 
 
-def delete_from_supabase(filepath):
-    """Удаляет файл из Supabase"""
-    if filepath:
-        try:
-            supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-            supabase.storage.from_('products').remove([filepath])
-            print(f"🗑️ Удален файл из Supabase: {filepath}")
-        except Exception as e:
-            print(f"⚠️ Не удалось удалить файл из Supabase: {e}")
+def delete_from_supabase(*paths, bucket=None):
+    """Удаляет файлы из Supabase после коммита транзакции (пачкой, см. store/deletions.py)"""
+    from .deletions import schedule_storage_delete
+    schedule_storage_delete(paths, bucket=bucket)
+
+
+def delete_image_files(instance):
+    """Удаляет из Supabase изображение instance вместе с адаптивными копиями"""
+    bucket, path = storage_location(instance, instance.image)
+    delete_from_supabase(path, *variant_paths(instance), bucket=bucket)
 
 
 @receiver(pre_delete, sender=Category)
 def delete_category_images(sender, instance, **kwargs):
     """Удаляет изображение из Supabase при удалении категории"""
-    delete_from_supabase(instance.image)
+    delete_image_files(instance)
+
+
+@receiver(post_save, sender=Promotion)
+def refresh_promotion_prices(sender, instance, **kwargs):
+    """Пересчитывает итоговые цены товаров акции после ее изменения"""
+    schedule_effective_price_refresh(
+        instance.product_promotions.values_list('product_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=ProductPromotion)
+@receiver(post_delete, sender=ProductPromotion)
+def refresh_product_promotion_prices(sender, instance, **kwargs):
+    """Пересчитывает итоговую цену товара при добавлении/удалении его из акции"""
+    schedule_effective_price_refresh([instance.product_id])
+
+
+@receiver(post_save, sender=Product)
+def update_product_suggestions(sender, instance, **kwargs):
+    """Обновляет индекс подсказок поиска при изменении товара"""
+    from .suggest import suggest_index
+    suggest_index.product_changed(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_suggestions(sender, instance, **kwargs):
+    from .suggest import suggest_index
+    suggest_index.product_changed(instance, deleted=True)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_navigation(sender, instance, **kwargs):
+    """Сбрасывает кеш меню категорий"""
+    from .navigation import invalidate_nav_categories
+    invalidate_nav_categories()
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestions(sender, instance, **kwargs):
+    """Обновляет индекс подсказок поиска при изменении категории"""
+    from .suggest import suggest_index
+    suggest_index.category_changed(instance)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestions(sender, instance, **kwargs):
+    from .suggest import suggest_index
+    suggest_index.category_changed(instance, deleted=True)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Category)
+def enqueue_image_uploads(sender, instance, **kwargs):
+    """Ставит в очередь изображения, принятые формой до сохранения объекта"""
+    from .uploads import enqueue_pending_uploads
+    enqueue_pending_uploads(instance)
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_prices(sender, instance, created, **kwargs):
+    """Пересчитывает итоговую цену при изменении цены товара"""
+    if not created:
+        schedule_effective_price_refresh([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+@receiver(post_save, sender=ProductPromotion)
+@receiver(post_delete, sender=ProductPromotion)
+def invalidate_storefront_cache(sender, instance, **kwargs):
+    """Сбрасывает кеш страниц витрины после коммита изменений каталога и акций"""
+    from .page_cache import invalidate_page_cache
+    invalidate_page_cache()
 
 
 # from django.db import models
@@ -0,0 +1,73 @@
+"""
+Кеш списка категорий для навигации сайта.
+
+Список хранится в общем кеше (Redis) под версионированным ключом, а перед
+ним — маленький LRU в памяти процесса. Версия увеличивается сигналами
+сохранения/удаления категории, поэтому старые ключи просто перестают
+читаться. Версию в Redis процесс сверяет не чаще раза в LOCAL_TTL секунд.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import hot_cache
+
+VERSION_CACHE_KEY = 'nav:categories:version'
+LOCAL_TTL = 5
+LOCAL_MAXSIZE = 4
+
+_local = OrderedDict()
+_local_lock = threading.Lock()
+_version = {'value': None, 'checked_at': 0}
+
+
+def _current_version():
+    now = time.monotonic()
+    if now - _version['checked_at'] >= LOCAL_TTL:
+        cache.add(VERSION_CACHE_KEY, 1, None)
+        _version['value'] = cache.get(VERSION_CACHE_KEY, 1)
+        _version['checked_at'] = now
+    return _version['value']
+
+
+def get_nav_categories():
+    """Категории для меню: LRU процесса -> Redis -> база"""
+    version = _current_version()
+
+    with _local_lock:
+        if version in _local:
+            _local.move_to_end(version)
+            return _local[version]
+
+    from .models import Category
+
+    # После сброса версии ключ холодный во всех процессах сразу —
+    # в базу идет только один из них (см. hot_cache)
+    categories = hot_cache.get_or_set(
+        f'nav:categories:v{version}',
+        lambda: list(Category.objects.all()),
+        settings.CACHE_TTL['DAY'],
+    )
+
+    with _local_lock:
+        _local[version] = categories
+        while len(_local) > LOCAL_MAXSIZE:
+            _local.popitem(last=False)
+    return categories
+
+
+def invalidate_nav_categories():
+    """Сбрасывает кеш меню категорий во всех процессах"""
+    cache.add(VERSION_CACHE_KEY, 1, None)
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        pass
+
+    # Свой процесс видит новую версию сразу, остальные — через LOCAL_TTL
+    with _local_lock:
+        _local.clear()
+    _version['checked_at'] = 0
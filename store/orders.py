@@ -0,0 +1,93 @@
+"""
+Оформление заказа из корзины.
+
+Все делается в одной транзакции и за постоянное число запросов, сколько бы
+строк ни было в корзине: один SELECT товаров, один UPDATE остатков (условный —
+только если хватает на всех), INSERT заказа и один bulk INSERT позиций.
+Корзина очищается после коммита.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from .models import OrderItem, Product
+
+
+class CheckoutError(Exception):
+    """Заказ не оформлен; текст исключения можно показать покупателю"""
+
+
+class EmptyCartError(CheckoutError):
+    """В корзине нет товаров, которые еще есть в каталоге"""
+
+    def __init__(self, message='Корзина пуста'):
+        super().__init__(message)
+
+
+class OutOfStockError(CheckoutError):
+    """На складе не хватает товара для части строк корзины"""
+
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(product.name for product in products)
+        super().__init__(f'Недостаточно товара на складе: {names}')
+
+
+def _reserve_stock(quantities):
+    """Списывает остатки одним UPDATE; возвращает False, если хоть одной строки не хватило"""
+    enough = Q()
+    for product_id, quantity in quantities.items():
+        enough |= Q(id=product_id, stock__gte=quantity)
+
+    decrement = Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    updated = Product.objects.filter(enough).update(stock=F('stock') - decrement)
+    return updated == len(quantities)
+
+
+def place_order(order, cart):
+    """
+    Сохраняет заказ (несохраненный экземпляр Order) с позициями из корзины.
+
+    Бросает OutOfStockError, если остатков не хватает, и EmptyCartError,
+    если в корзине не осталось товаров из каталога, — тогда в базе ничего
+    не меняется и корзина остается как была.
+    """
+    quantities = cart.quantities()
+    if not quantities:
+        raise EmptyCartError()
+
+    try:
+        with transaction.atomic():
+            products = list(Product.objects.filter(id__in=quantities))
+            # Удаленные из каталога товары просто не попадают в заказ
+            quantities = {product.pk: quantities[product.pk] for product in products}
+            if not quantities:
+                raise EmptyCartError('Товаров из корзины больше нет в каталоге')
+
+            if not _reserve_stock(quantities):
+                # Исключение откатывает транзакцию вместе с частично списанными остатками
+                raise OutOfStockError(products)
+
+            order.save()
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=product,
+                    price=product.price,
+                    quantity=quantities[product.pk],
+                )
+                for product in products
+            ])
+
+            transaction.on_commit(cart.clear)
+    except OutOfStockError as e:
+        # Остатки перечитываем после отката: между SELECT и UPDATE товар мог
+        # забрать параллельный заказ, а в products — остатки до него
+        current = dict(Product.objects.filter(id__in=quantities).values_list('id', 'stock'))
+        missing = [product for product in e.products if current.get(product.pk, 0) < quantities[product.pk]]
+        raise OutOfStockError(missing or e.products) from None
+
+    return order
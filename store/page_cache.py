@@ -0,0 +1,141 @@
+"""
+Кеш страниц витрины для анонимных посетителей.
+
+Страница целиком (index, категория, товар, "о нас", отзывы) кешируется по
+URL с query string для посетителей без входа, пустой корзины и сообщений —
+только у них страница одинакова для всех. Для остальных кешируется
+фрагмент с сеткой карточек товаров (тег {% cache %} в шаблонах с
+page_cache.ttl и page_cache.token из context processor).
+
+Ключи содержат поколение кеша: версию (увеличивается после коммита
+изменений товаров, категорий и акций) и ближайшую границу начала/окончания
+акции. Когда граница проходит, поколение меняется само — цены и таймеры
+акций на закешированных страницах не устаревают. Остатки на складе
+обновляются на странице не позже CACHE_TTL['MEDIUM'] — при оформлении
+заказа они все равно проверяются заново (store/orders.py).
+"""
+import hashlib
+import math
+import time
+from collections import namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min, Q
+from django.http import HttpResponse
+from django.utils import timezone
+
+from . import hot_cache
+
+VERSION_CACHE_KEY = 'page_cache:version'
+
+# token — поколение для ключей кеша, ttl — сколько секунд оно еще действует
+Generation = namedtuple('Generation', ['token', 'ttl'])
+
+
+def _version():
+    cache.add(VERSION_CACHE_KEY, 1, None)
+    return cache.get(VERSION_CACHE_KEY, 1)
+
+
+def _next_promotion_boundary(version):
+    """Ближайшее будущее начало или окончание активной акции (или None)"""
+    key = f'page_cache:v{version}:boundary'
+    now = timezone.now()
+    boundary = cache.get(key)
+    if boundary is None or (boundary and boundary <= now):
+        from .models import Promotion
+
+        bounds = Promotion.objects.filter(is_active=True).aggregate(
+            next_start=Min('start_date', filter=Q(start_date__gt=now)),
+            next_end=Min('end_date', filter=Q(end_date__gt=now)),
+        )
+        boundary = min(filter(None, bounds.values()), default=None) or False
+        cache.set(key, boundary, settings.CACHE_TTL['DAY'])
+    return boundary or None
+
+
+def cache_generation():
+    """Текущее поколение кеша страниц (Generation)"""
+    version = _version()
+    boundary = _next_promotion_boundary(version)
+    ttl = settings.CACHE_TTL['MEDIUM']
+    if boundary is None:
+        return Generation(f'{version}', ttl)
+    seconds = math.ceil((boundary - timezone.now()).total_seconds())
+    return Generation(f'{version}.{int(boundary.timestamp())}', max(1, min(ttl, seconds)))
+
+
+def invalidate_page_cache():
+    """Сбрасывает кеш страниц и фрагментов после коммита текущей транзакции"""
+    transaction.on_commit(_bump_version)
+
+
+def _bump_version():
+    cache.add(VERSION_CACHE_KEY, 1, None)
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        pass
+
+
+def _is_cacheable(request):
+    """Страница одинакова для всех: аноним без корзины и без сообщений"""
+    from .cart import SessionCart
+
+    if request.method != 'GET' or request.user.is_authenticated:
+        return False
+    if len(get_messages(request)):
+        return False
+    return not SessionCart(request).summary()[0]
+
+
+def _page_key(request, token):
+    url = f'{request.get_host()}{request.get_full_path()}'
+    return f'page_cache:{token}:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+def cache_anonymous_page(view):
+    """Декоратор view: отдает страницу из кеша для анонимных посетителей"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable(request):
+            return view(request, *args, **kwargs)
+
+        generation = cache_generation()
+        key = _page_key(request, generation.token)
+        # Пока одна страница пересчитывается, остальные запросы получают
+        # старую копию или ждут новую, а не идут в базу (см. hot_cache)
+        cached = hot_cache.lookup(key)
+        if not hot_cache.must_compute(cached):
+            content, content_type = cached.value
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Page-Cache'] = cached.state
+            return response
+
+        started = time.monotonic()
+        try:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+                hot_cache.store(key, (response.content, response['Content-Type']), generation.ttl,
+                                time.monotonic() - started)
+                response['X-Page-Cache'] = cached.state
+            else:
+                # 404, редирект и т.п. не кешируются — пусть другие запросы
+                # не ждут этот ключ, а сразу считают сами
+                hot_cache.store_negative(key)
+        except Exception:
+            hot_cache.store_negative(key)
+            raise
+        finally:
+            if cached.locked:
+                hot_cache.release(key)
+        return response
+
+    return wrapper
@@ -0,0 +1,170 @@
+"""
+Keyset-пагинация каталога (по курсору вместо номера страницы).
+
+Страницы упорядочены по одному из ORDERINGS (новые, цена, релевантность
+поиска) и выбираются условием по ключу последней/первой строки, поэтому
+глубокие страницы стоят столько же, сколько первая: без OFFSET и без
+COUNT(*) на каждый запрос. Порядок записан в курсоре — следующая страница
+продолжает ту же сортировку. Общее число товаров приблизительное — берется
+из кеша.
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+# Порядки keyset-пагинации: имя -> поля ('-' — по убыванию), последним
+# всегда id, чтобы ключ был уникальным. Поля price/rank — аннотации,
+# queryset должен их уже содержать (annotate_sale_price, search_products)
+ORDERINGS = {
+    'new': ('-created', 'id'),
+    'price': ('effective_sale_price', 'id'),
+    '-price': ('-effective_sale_price', 'id'),
+    'rank': ('-rank', '-created', 'id'),
+}
+DEFAULT_ORDERING = 'new'
+
+# Как восстановить значение ключа из JSON курсора
+_DECODERS = {
+    'created': datetime.fromisoformat,
+    'effective_sale_price': Decimal,
+    'rank': float,
+    'id': int,
+}
+
+
+class KeysetPage:
+    """Страница keyset-пагинации; в шаблоне отличается по is_keyset"""
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor, prev_cursor, approx_count):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.approx_count = approx_count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def _key_fields(ordering):
+    return [field.lstrip('-') for field in ORDERINGS[ordering]]
+
+
+def _key_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(product, direction, ordering=DEFAULT_ORDERING):
+    """Непрозрачный курсор: порядок, ключ строки в этом порядке и направление"""
+    key = [_key_value(getattr(product, field)) for field in _key_fields(ordering)]
+    payload = json.dumps({'o': ordering, 'k': key, 'd': direction})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering=DEFAULT_ORDERING):
+    """
+    Возвращает (ключ, direction) или None для пустого/битого курсора и
+    курсора другого порядка (сменили сортировку — начинаем с первой страницы)
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload['d']
+        if direction not in ('next', 'prev') or payload['o'] != ordering:
+            return None
+        fields = _key_fields(ordering)
+        if len(payload['k']) != len(fields):
+            return None
+        key = tuple(_DECODERS[field](value) for field, value in zip(fields, payload['k']))
+        return key, direction
+    except (ValueError, KeyError, TypeError, ArithmeticError):
+        return None
+
+
+def _after(ordering, key, backwards):
+    """
+    Условие "строка дальше key" в порядке ordering (в обратном — если
+    backwards): (a, b, id) > (x, y, z) раскрывается в
+    a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ORDERINGS[ordering], key):
+        name = field.lstrip('-')
+        descending = field.startswith('-') != backwards
+        condition |= Q(**equal, **{f'{name}__{"lt" if descending else "gt"}': value})
+        equal[name] = value
+    return condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ORDERINGS[ordering]]
+
+
+def approximate_count(queryset):
+    """Количество строк queryset, закешированное на CACHE_TTL['SHORT']"""
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    return cache.get_or_set(
+        f'listing_count:{digest}',
+        queryset.count,
+        settings.CACHE_TTL['SHORT'],
+    )
+
+
+def keyset_paginate(queryset, cursor, per_page, ordering=DEFAULT_ORDERING):
+    """Страница товаров после (или до) курсора в порядке ORDERINGS[ordering]"""
+    position = decode_cursor(cursor, ordering)
+    approx_count = approximate_count(queryset)
+
+    if position is None:
+        rows = list(queryset.order_by(*ORDERINGS[ordering])[:per_page + 1])
+        has_more, backwards = len(rows) > per_page, False
+    else:
+        key, direction = position
+        backwards = direction == 'prev'
+        queryset = queryset.filter(_after(ordering, key, backwards))
+        order = _reverse(ordering) if backwards else ORDERINGS[ordering]
+        rows = list(queryset.order_by(*order)[:per_page + 1])
+        has_more = len(rows) > per_page
+
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    # В сторону движения "еще есть" знаем по лишней строке; в обратную — раз пришли оттуда
+    has_next = has_more if not backwards else True
+    has_previous = has_more if backwards else position is not None
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1], 'next', ordering) if rows and has_next else None,
+        prev_cursor=encode_cursor(rows[0], 'prev', ordering) if rows and has_previous else None,
+        approx_count=approx_count,
+    )
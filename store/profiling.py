@@ -0,0 +1,174 @@
+"""
+Профилирование запросов в продакшене (включается REQUEST_PROFILING=1).
+
+RequestProfilingMiddleware собирает по каждому запросу:
+
+* SQL — число и суммарное время (connection.execute_wrapper) и повторы
+  одинаковых запросов с разными параметрами (отпечатки N+1);
+* вызовы Supabase — число и время HTTP-запросов клиента
+  (event hooks httpx в store/supabase_client.py);
+* время рендера шаблонов;
+* попадания/промахи горячего кеша (store/hot_cache.py).
+
+Итог уходит в заголовок Server-Timing (видно во вкладке Network браузера)
+и, для доли REQUEST_PROFILING_SAMPLE_RATE запросов, а также для медленных
+и с N+1, — строкой JSON в логгер store.profiling.
+"""
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Отпечаток, повторившийся столько раз за запрос, считается N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+_current = ContextVar('request_profile', default=None)
+
+_NUMBER_RE = re.compile(r'\b\d+(\.\d+)?\b')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+
+
+def fingerprint(sql):
+    """SQL без значений: запросы, отличающиеся только параметрами, совпадают"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+        self.storage_count = 0
+        self.storage_time = 0.0
+        self.template_time = 0.0
+        self.cache = Counter()
+
+    def n_plus_one(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count >= N_PLUS_ONE_THRESHOLD}
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        cache = ' '.join(f'{state}={count}' for state, count in sorted(self.cache.items()))
+        parts = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_count} queries"',
+            f'storage;dur={self.storage_time * 1000:.1f};desc="{self.storage_count} calls"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.total_ms():.1f}',
+        ]
+        if cache:
+            parts.append(f'cache;desc="{cache}"')
+        return ', '.join(parts)
+
+
+def _profile_query(execute, sql, params, many, context):
+    profile = _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if profile is not None:
+            profile.db_time += time.perf_counter() - started
+            profile.db_count += 1
+            profile.fingerprints[fingerprint(sql)] += 1
+
+
+def record_storage_call(duration):
+    """Вызов Supabase длительностью duration секунд (из event hooks httpx)"""
+    profile = _current.get()
+    if profile is not None:
+        profile.storage_count += 1
+        profile.storage_time += duration
+
+
+def record_cache(state):
+    """Результат обращения к кешу (hit, miss, stale, ...) в текущем запросе"""
+    profile = _current.get()
+    if profile is not None:
+        profile.cache[state] += 1
+
+
+def _instrument_templates():
+    """Оборачивает рендер шаблонов Django (один раз на процесс)"""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, '_profiled', False):
+        return
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return original(self, context, request)
+        started = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+
+    render._profiled = True
+    Template.render = render
+
+
+class RequestProfilingMiddleware:
+    """Считает SQL, вызовы Supabase, рендер и кеш запроса; см. модуль"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0.05)
+        self.slow_ms = getattr(settings, 'REQUEST_PROFILING_SLOW_MS', 500)
+        _instrument_templates()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_profile_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        response['Server-Timing'] = profile.server_timing()
+        self._log(request, response, profile)
+        return response
+
+    def _log(self, request, response, profile):
+        total_ms = profile.total_ms()
+        n_plus_one = profile.n_plus_one()
+        if not (n_plus_one or total_ms >= self.slow_ms or random.random() < self.sample_rate):
+            return
+
+        match = getattr(request, 'resolver_match', None)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'db_count': profile.db_count,
+            'db_ms': round(profile.db_time * 1000, 1),
+            'storage_count': profile.storage_count,
+            'storage_ms': round(profile.storage_time * 1000, 1),
+            'template_ms': round(profile.template_time * 1000, 1),
+            'cache': dict(profile.cache),
+            'n_plus_one': [{'sql': sql[:300], 'count': count} for sql, count in n_plus_one.items()],
+        }, ensure_ascii=False))
@@ -0,0 +1,42 @@
+"""
+Полнотекстовый поиск товаров.
+
+На PostgreSQL используется сохраненный вектор Product.search_vector с
+русской морфологией (триггер БД + GIN-индекс из миграции 0007), результаты
+сортируются по релевантности. На SQLite (локальная разработка) остается
+прежний поиск через icontains.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = 'russian'
+
+
+def uses_full_text_search():
+    """Доступен ли полнотекстовый поиск на текущей базе"""
+    return connection.vendor == 'postgresql'
+
+
+def search_products(queryset, query):
+    """Фильтрует queryset товаров по строке поиска, самые релевантные — первыми"""
+    if uses_full_text_search():
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        # float8 вместо real: значение из курсора keyset-пагинации должно
+        # сравниваться с rank точно
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=Cast(SearchRank(F('search_vector'), search_query), FloatField())
+        ).defer('search_vector').order_by('-rank', '-created', 'id')
+
+    return queryset.filter(
+        Q(name__icontains=query) |
+        Q(description__icontains=query) |
+        Q(brand__icontains=query) |
+        Q(material__icontains=query)
+    )
+
+
+def search_ordering(query):
+    """Порядок keyset-пагинации результатов search_products (store/pagination.py)"""
+    return 'rank' if query and uses_full_text_search() else 'new'
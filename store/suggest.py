@@ -0,0 +1,259 @@
+"""
+Подсказки для строки поиска (/api/search/suggest/).
+
+Индекс держится в памяти процесса: префиксный (отсортированный список слов
+для bisect) и триграммный (триграмма -> ключи записей) по названиям товаров,
+брендам и категориям. Строится при старте воркера (см. wsgi.py) или при
+первом запросе, дальше обновляется сигналами post_save/post_delete.
+Изменения в других процессах подхватываются по версии в общем кеше.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+VERSION_CACHE_KEY = 'search_suggest:version'
+# Как часто (в секундах) сверять локальный индекс с версией в кеше
+VERSION_CHECK_INTERVAL = 5
+MAX_LIMIT = 20
+# Сколько записей максимум просматривать по префиксу на один запрос
+MAX_CANDIDATES = 500
+# Минимальная доля совпавших триграмм для нечеткой подсказки
+MIN_SIMILARITY = 0.5
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Приводит текст к виду для сравнения: нижний регистр, ё -> е"""
+    return (text or '').casefold().replace('ё', 'е').strip()
+
+
+def tokenize(text):
+    return _WORD_RE.findall(normalize(text))
+
+
+def trigrams(text):
+    """Триграммы слов в стиле pg_trgm: слово дополняется пробелами по краям"""
+    result = set()
+    for word in tokenize(text):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class SuggestIndex:
+    """Триграммный и префиксный индекс подсказок"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._trigrams = {}
+        self._prefixes = []
+        self._brand_counts = Counter()
+        self._product_brands = {}
+        self.built = False
+        self.version = None
+        self._version_checked_at = 0
+        self._bulk_loading = False
+
+    # Построение
+
+    def build(self):
+        """Полностью перестраивает индекс из базы"""
+        from .models import Category, Product
+
+        version = cache.get(VERSION_CACHE_KEY)
+        products = Product.objects.filter(available=True).values('id', 'name', 'slug', 'brand')
+        categories = Category.objects.values('id', 'name', 'slug')
+
+        fresh = SuggestIndex()
+        fresh._bulk_loading = True
+        for product in products.iterator(chunk_size=2000):
+            fresh._add_product(product)
+        for category in categories:
+            fresh._add_category(category)
+        fresh._prefixes.sort()
+
+        with self._lock:
+            self._entries = fresh._entries
+            self._trigrams = fresh._trigrams
+            self._prefixes = fresh._prefixes
+            self._brand_counts = fresh._brand_counts
+            self._product_brands = fresh._product_brands
+            self.built = True
+            self.version = version
+            self._version_checked_at = time.monotonic()
+
+    def ensure_fresh(self):
+        """Строит индекс при первом обращении и перестраивает, если другой процесс изменил данные"""
+        if not self.built:
+            with self._lock:
+                if not self.built:
+                    self.build()
+            return
+
+        now = time.monotonic()
+        if now - self._version_checked_at < VERSION_CHECK_INTERVAL:
+            return
+        self._version_checked_at = now
+        if cache.get(VERSION_CACHE_KEY) != self.version:
+            self.build()
+
+    # Изменение записей
+
+    def _add_entry(self, key, entry):
+        entry['normalized'] = normalize(entry['title'])
+        self._entries[key] = entry
+        for gram in trigrams(entry['title']):
+            self._trigrams.setdefault(gram, set()).add(key)
+        for word in set(tokenize(entry['title'])):
+            if self._bulk_loading:
+                self._prefixes.append((word, key))
+            else:
+                bisect.insort(self._prefixes, (word, key))
+
+    def _remove_entry(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for gram in trigrams(entry['title']):
+            keys = self._trigrams.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._trigrams[gram]
+        for word in set(tokenize(entry['title'])):
+            position = bisect.bisect_left(self._prefixes, (word, key))
+            if position < len(self._prefixes) and self._prefixes[position] == (word, key):
+                del self._prefixes[position]
+
+    def _add_product(self, product):
+        self._add_entry(('product', product['id']), {
+            'type': 'product',
+            'id': product['id'],
+            'title': product['name'],
+            'slug': product['slug'],
+        })
+        brand = normalize(product['brand'])
+        if brand:
+            self._product_brands[product['id']] = brand
+            self._brand_counts[brand] += 1
+            if ('brand', brand) not in self._entries:
+                self._add_entry(('brand', brand), {
+                    'type': 'brand',
+                    'id': None,
+                    'title': product['brand'].strip(),
+                    'slug': None,
+                })
+
+    def _remove_product(self, product_id):
+        self._remove_entry(('product', product_id))
+        brand = self._product_brands.pop(product_id, None)
+        if brand:
+            self._brand_counts[brand] -= 1
+            if self._brand_counts[brand] <= 0:
+                del self._brand_counts[brand]
+                self._remove_entry(('brand', brand))
+
+    def _add_category(self, category):
+        self._add_entry(('category', category['id']), {
+            'type': 'category',
+            'id': category['id'],
+            'title': category['name'],
+            'slug': category['slug'],
+        })
+
+    def product_changed(self, product, deleted=False):
+        with self._lock:
+            if self.built:
+                self._remove_product(product.pk)
+                if not deleted and product.available:
+                    self._add_product({
+                        'id': product.pk,
+                        'name': product.name,
+                        'slug': product.slug,
+                        'brand': product.brand,
+                    })
+        self._bump_version()
+
+    def category_changed(self, category, deleted=False):
+        with self._lock:
+            if self.built:
+                self._remove_entry(('category', category.pk))
+                if not deleted:
+                    self._add_category({'id': category.pk, 'name': category.name, 'slug': category.slug})
+        self._bump_version()
+
+    def _bump_version(self):
+        """Сообщает остальным процессам, что индекс надо перестроить"""
+        cache.add(VERSION_CACHE_KEY, 0, None)
+        try:
+            version = cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            return
+        # Собственный индекс уже актуален — не перестраиваем его из-за своей же записи
+        with self._lock:
+            if self.version is None or self.version == version - 1:
+                self.version = version
+
+    # Поиск
+
+    def suggest(self, query, limit=8):
+        """Возвращает до limit записей, лучше всего совпадающих с query"""
+        query = normalize(query)
+        words = tokenize(query)
+        if not words:
+            return []
+
+        with self._lock:
+            candidates = []
+            seen = set()
+
+            # Префикс последнего (недописанного) слова, остальные слова должны входить в название
+            prefix, leading = words[-1], words[:-1]
+            position = bisect.bisect_left(self._prefixes, (prefix,))
+            end = min(position + MAX_CANDIDATES, len(self._prefixes))
+            while position < end:
+                word, key = self._prefixes[position]
+                if not word.startswith(prefix):
+                    break
+                position += 1
+                if key in seen:
+                    continue
+                seen.add(key)
+                title = self._entries[key]['normalized']
+                if all(word in title for word in leading):
+                    score = 2.0 if title.startswith(query) else 1.0
+                    candidates.append((-score, len(title), title, key))
+
+            # Нечеткое совпадение по триграммам (опечатки) — только если точных не хватило
+            if len(candidates) < limit and len(query) >= 3:
+                query_grams = trigrams(query)
+                counts = Counter()
+                for gram in query_grams:
+                    counts.update(self._trigrams.get(gram, ()))
+                for key, count in counts.items():
+                    similarity = count / len(query_grams)
+                    if key in seen or similarity < MIN_SIMILARITY:
+                        continue
+                    title = self._entries[key]['normalized']
+                    candidates.append((-similarity, len(title), title, key))
+
+            best = heapq.nsmallest(limit, candidates)
+            return [self._entries[key] for _, _, _, key in best]
+
+
+suggest_index = SuggestIndex()
+
+
+def warm_up():
+    """Строит индекс заранее, чтобы первый запрос воркера не ждал"""
+    try:
+        suggest_index.ensure_fresh()
+    except Exception as e:
+        print(f"⚠️ Не удалось построить индекс подсказок: {e}")
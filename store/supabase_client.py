@@ -0,0 +1,192 @@
+"""
+Общий клиент Supabase для всего проекта.
+
+Клиент создается один раз на процесс (лениво и потокобезопасно) поверх
+httpx.Client с пулом keep-alive соединений и таймаутами, поэтому массовые
+операции с картинками не открывают новое TLS-соединение на каждый файл.
+
+Для тестов и локальной разработки без Supabase есть FakeSupabaseClient —
+хранит файлы в памяти; подключается через install_fake_client() или
+переменной окружения SUPABASE_FAKE=1.
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+
+# Таймауты HTTP (секунды): соединение, чтение/запись, ожидание свободного соединения в пуле
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+POOL_TIMEOUT = 10
+# Пул соединений с Supabase на процесс
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 60
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _mark_started(request):
+    request.extensions['started_at'] = time.perf_counter()
+
+
+def _record_duration(response):
+    # Время до получения заголовков ответа — для профилирования запросов
+    started = response.request.extensions.get('started_at')
+    if started is not None:
+        from .profiling import record_storage_call
+        record_storage_call(time.perf_counter() - started)
+
+
+def _build_client(key):
+    import httpx
+    from supabase import ClientOptions, create_client
+
+    http_client = httpx.Client(
+        event_hooks={'request': [_mark_started], 'response': [_record_duration]},
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT, pool=POOL_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        follow_redirects=True,
+    )
+    return create_client(
+        settings.SUPABASE_URL,
+        key,
+        options=ClientOptions(httpx_client=http_client, storage_client_timeout=READ_TIMEOUT),
+    )
+
+
+def get_supabase_client(service=False):
+    """
+    Клиент Supabase, общий для процесса.
+
+    service=True — клиент с SUPABASE_SERVICE_KEY (запись в обход RLS),
+    иначе с SUPABASE_KEY.
+    """
+    kind = 'service' if service else 'anon'
+    client = _clients.get(kind)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(kind)
+        if client is None:
+            if os.getenv('SUPABASE_FAKE') == '1':
+                client = _clients.setdefault('fake', FakeSupabaseClient())
+            else:
+                key = settings.SUPABASE_SERVICE_KEY if service else settings.SUPABASE_KEY
+                client = _build_client(key)
+            _clients[kind] = client
+    return client
+
+
+def get_bucket(bucket_name=None, service=False):
+    """Файловое API bucket'а (по умолчанию settings.SUPABASE_BUCKET)"""
+    bucket_name = bucket_name or getattr(settings, 'SUPABASE_BUCKET', 'products')
+    return get_supabase_client(service=service).storage.from_(bucket_name)
+
+
+def install_fake_client(client=None):
+    """Подменяет клиент Supabase фейком в памяти (для тестов); возвращает фейк"""
+    client = client or FakeSupabaseClient()
+    with _lock:
+        _clients.clear()
+        _clients.update({'anon': client, 'service': client, 'fake': client})
+    return client
+
+
+def reset_clients():
+    """Забывает созданные клиенты — следующий вызов создаст новые"""
+    with _lock:
+        _clients.clear()
+
+
+class FakeBucket:
+    """Bucket в памяти с тем же интерфейсом, что у storage3"""
+
+    def __init__(self, storage, bucket_id):
+        self._storage = storage
+        self.id = bucket_id
+
+    @property
+    def _files(self):
+        return self._storage.buckets.setdefault(self.id, {})
+
+    def _log(self, method, *args):
+        self._storage.calls.append((method, self.id, *args))
+
+    def upload(self, path, file, file_options=None):
+        self._log('upload', path)
+        if hasattr(file, 'read'):
+            data = file.read()
+        elif isinstance(file, (bytes, bytearray)):
+            data = bytes(file)
+        else:
+            with open(file, 'rb') as f:
+                data = f.read()
+        content_type = (file_options or {}).get('content-type', 'application/octet-stream')
+        self._files[path] = (data, content_type)
+        return {'Key': f'{self.id}/{path}'}
+
+    def update(self, path, file, file_options=None):
+        return self.upload(path, file, file_options)
+
+    def remove(self, paths):
+        self._log('remove', *paths)
+        removed = []
+        for path in paths:
+            if self._files.pop(path, None) is not None:
+                removed.append({'name': path})
+        return removed
+
+    def download(self, path, options=None, query_params=None):
+        self._log('download', path)
+        return self._files[path][0]
+
+    def exists(self, path):
+        self._log('exists', path)
+        return path in self._files
+
+    def info(self, path):
+        self._log('info', path)
+        data, content_type = self._files[path]
+        return {'name': path, 'size': len(data), 'content_type': content_type}
+
+    def list(self, path=None, options=None):
+        self._log('list', path)
+        options = options or {}
+        prefix = f"{path.strip('/')}/" if path else ''
+        search = options.get('search', '')
+        entries = []
+        for name, (data, content_type) in sorted(self._files.items()):
+            if not name.startswith(prefix):
+                continue
+            rest = name[len(prefix):]
+            if '/' in rest or not rest.startswith(search):
+                continue
+            entries.append({'name': rest, 'metadata': {'size': len(data), 'mimetype': content_type}})
+        return entries[:options.get('limit', 100)]
+
+    def get_public_url(self, path, options=None):
+        return f"{settings.SUPABASE_URL}/storage/v1/object/public/{self.id}/{path}"
+
+
+class FakeStorage:
+    def __init__(self):
+        self.buckets = {}
+        self.calls = []
+
+    def from_(self, bucket_id):
+        return FakeBucket(self, bucket_id)
+
+
+class FakeSupabaseClient:
+    """Фейковый клиент Supabase: файлы в памяти, вызовы записываются в storage.calls"""
+
+    def __init__(self):
+        self.storage = FakeStorage()
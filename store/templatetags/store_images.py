@@ -0,0 +1,41 @@
+from django import template
+from django.utils.html import format_html
+
+from store.images import DEFAULT_SIZES, srcset, thumbnail_url, variant_urls
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_srcset(obj, ext='webp'):
+    """srcset копий изображения: <img srcset="{% image_srcset product %}">"""
+    return srcset(obj, ext)
+
+
+@register.simple_tag
+def image_thumbnail(obj, min_width=160):
+    """URL маленькой копии (для превью), если копий нет — оригинал"""
+    return thumbnail_url(obj, min_width) or ''
+
+
+@register.simple_tag
+def responsive_image(obj, src=None, alt='', css_class='', style='', sizes=DEFAULT_SIZES):
+    """
+    <picture> с WebP и JPEG копиями изображения объекта.
+
+    Если копий еще нет (старые товары, внешний URL) — обычный <img src>.
+    """
+    src = src or thumbnail_url(obj, 640) or ''
+    jpeg = ', '.join(f'{url} {width}w' for url, width in variant_urls(obj, 'jpg'))
+    if not jpeg:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" style="{}" loading="lazy">',
+            src, css_class, alt, style,
+        )
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}" style="{}" loading="lazy">'
+        '</picture>',
+        srcset(obj, 'webp'), sizes, src, jpeg, sizes, css_class, alt, style,
+    )
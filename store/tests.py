@@ -0,0 +1,523 @@
+import threading
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.http import Http404
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+
+from . import hot_cache
+from .page_cache import _page_key, cache_anonymous_page, cache_generation
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'store-tests'}}
+
+
+class FailingCache(BaseCache):
+    """
+    Недоступный кеш: LOCATION='ignore' — как django-redis с IGNORE_EXCEPTIONS
+    (get → default, add → None), 'raise' — каждое обращение падает
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.mode = location
+
+    def _fail(self, default=None):
+        if self.mode == 'raise':
+            raise ConnectionError('cache is down')
+        return default
+
+    def get(self, key, default=None, version=None):
+        return self._fail(default)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._fail()
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._fail()
+
+    def delete(self, key, version=None):
+        return self._fail()
+
+
+def failing_cache(mode):
+    return {'default': {'BACKEND': 'store.tests.FailingCache', 'LOCATION': mode}}
+
+
+@override_settings(CACHES=LOCMEM)
+class HotCacheWaitTests(TestCase):
+    def setUp(self):
+        hot_cache.cache.clear()
+
+    def _wait_in_thread(self, key):
+        result = {}
+
+        def wait():
+            started = time.monotonic()
+            result['lookup'] = hot_cache.lookup(key, wait=5)
+            result['elapsed'] = time.monotonic() - started
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        return thread, result
+
+    def test_waiter_stops_when_lock_released_without_value(self):
+        holder = hot_cache.lookup('k')
+        self.assertEqual(holder.state, hot_cache.MISS)
+
+        thread, result = self._wait_in_thread('k')
+        time.sleep(0.05)
+        hot_cache.release('k')
+        thread.join()
+
+        self.assertLess(result['elapsed'], 1)
+        self.assertEqual(result['lookup'].state, hot_cache.MISS)
+        self.assertTrue(result['lookup'].locked)
+
+    def test_waiter_gets_negative_marker(self):
+        hot_cache.lookup('k')
+        thread, result = self._wait_in_thread('k')
+        time.sleep(0.05)
+        hot_cache.store_negative('k')
+        hot_cache.release('k')
+        thread.join()
+
+        self.assertLess(result['elapsed'], 1)
+        self.assertEqual(result['lookup'].state, hot_cache.UNCACHED)
+        self.assertTrue(hot_cache.must_compute(result['lookup']))
+        # Следующие запросы тоже не ждут и не берут блокировку
+        self.assertEqual(hot_cache.lookup('k', wait=5), hot_cache.Lookup(None, hot_cache.UNCACHED, False))
+
+    def test_page_cache_marks_404_uncacheable(self):
+        @cache_anonymous_page
+        def missing(request):
+            raise Http404
+
+        request = RequestFactory().get('/missing/')
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        request._messages = []
+        with self.assertRaises(Http404):
+            missing(request)
+
+        key = _page_key(request, cache_generation().token)
+        self.assertEqual(hot_cache.lookup(key, wait=5).state, hot_cache.UNCACHED)
+
+
+class HotCacheUnavailableTests(TestCase):
+    def _assert_computes_at_once(self):
+        started = time.monotonic()
+        result = hot_cache.lookup('k', wait=5)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(result, hot_cache.Lookup(None, hot_cache.UNAVAILABLE, False))
+        self.assertEqual(hot_cache.get_or_set('k', lambda: 'value', 60), 'value')
+
+    @override_settings(CACHES=failing_cache('ignore'))
+    def test_ignored_exceptions_do_not_wait(self):
+        self._assert_computes_at_once()
+
+    @override_settings(CACHES=failing_cache('raise'))
+    def test_backend_errors_do_not_wait(self):
+        self._assert_computes_at_once()
+
+
+class CategoryImageBucketTests(TestCase):
+    """У Category bucket входит в путь изображения: 'categories/cat.jpg'"""
+
+    def setUp(self):
+        from io import BytesIO
+
+        from PIL import Image
+
+        from .models import Category
+        from .supabase_client import install_fake_client, reset_clients
+
+        self.fake = install_fake_client()
+        self.addCleanup(reset_clients)
+        data = BytesIO()
+        Image.new('RGB', (400, 300), 'red').save(data, format='JPEG')
+        self.fake.storage.from_('categories').upload('cat.jpg', data.getvalue())
+        self.category = Category.objects.create(name='Цемент', slug='cement', image='categories/cat.jpg')
+
+    def test_optimize_images_uses_category_bucket(self):
+        from .image_batch import collect_targets, optimize_images
+        from .images import srcset
+        from .models import Category
+
+        report = optimize_images(collect_targets([Category]), processes=1, threads=1)
+
+        self.assertEqual(report.images, 1)
+        self.assertIn('cat_w320.webp', self.fake.storage.buckets['categories'])
+        self.assertNotIn('products', self.fake.storage.buckets)
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.image_variants['path'], 'categories/cat.jpg')
+        self.assertIn('/object/public/categories/cat_w320.webp 320w', srcset(self.category))
+        self.assertEqual(collect_targets([Category]), [])
+
+    def test_delete_removes_from_category_bucket(self):
+        self.category.image_variants = {'path': 'categories/cat.jpg', 'widths': [160]}
+        self.category.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+
+        removed = [call for call in self.fake.storage.calls if call[0] == 'remove']
+        self.assertEqual(removed, [('remove', 'categories', 'cat.jpg', 'cat_w160.webp', 'cat_w160.jpg')])
+
+
+class OptimizeImagesSharedPathTests(TestCase):
+    def test_rows_sharing_a_path_all_get_variants(self):
+        from io import BytesIO
+
+        from PIL import Image
+
+        from .image_batch import collect_targets, optimize_images
+        from .models import Category, Product, ProductImage
+        from .supabase_client import install_fake_client, reset_clients
+
+        fake = install_fake_client()
+        self.addCleanup(reset_clients)
+        data = BytesIO()
+        Image.new('RGB', (400, 300), 'blue').save(data, format='JPEG')
+        fake.storage.from_('products').upload('products/shared.jpg', data.getvalue())
+        category = Category.objects.create(name='Кирпич', slug='brick')
+        product = Product.objects.create(category=category, name='Кирпич', slug='brick-1', price=10, stock=5,
+                                         image='products/shared.jpg')
+        ProductImage.objects.create(product=product, image='products/shared.jpg')
+
+        # batch_size=1: строки одного файла не должны разойтись по пачкам
+        report = optimize_images(collect_targets([Product, ProductImage]), processes=1, threads=1, batch_size=1)
+
+        self.assertEqual(report.images, 2)
+        self.assertEqual(collect_targets([Product, ProductImage]), [])
+        # Файл скачан и порезан один раз, копии загружены один раз
+        calls = [call[:2] for call in fake.storage.calls]
+        self.assertEqual(calls.count(('download', 'products')), 1)
+        uploads = [call[2] for call in fake.storage.calls if call[0] == 'upload']
+        self.assertEqual(len(uploads), len(set(uploads)))
+
+
+class StorageDeleteBatchTests(TestCase):
+    def setUp(self):
+        from .supabase_client import install_fake_client, reset_clients
+
+        self.fake = install_fake_client()
+        self.addCleanup(reset_clients)
+
+    def test_rolled_back_savepoint_keeps_files(self):
+        from django.db import transaction
+
+        from .deletions import schedule_storage_delete
+
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_storage_delete(['kept-row.jpg'])
+            with self.assertRaises(ValueError), transaction.atomic():
+                schedule_storage_delete(['rolled-back.jpg'])
+                raise ValueError
+            with transaction.atomic():
+                schedule_storage_delete(['released.jpg'])
+
+        removed = [call for call in self.fake.storage.calls if call[0] == 'remove']
+        self.assertEqual(removed, [('remove', 'products', 'kept-row.jpg', 'released.jpg')])
+
+
+class BootExportTests(TestCase):
+    def test_boot_loads_export_in_manifest_order(self):
+        import tempfile
+        from io import StringIO
+
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+
+        from .export import export_store, resolve_models
+        from .models import Category, Product, UserProfile
+
+        user = User.objects.create_user('buyer', password='x')
+        UserProfile.objects.filter(user=user).update(phone='+79990000000')
+        category = Category.objects.create(name='Кирпич', slug='brick')
+        Product.objects.create(category=category, name='Кирпич', slug='brick-1', price=10, stock=5)
+        directory = tempfile.mkdtemp()
+        export_store(directory, resolve_models([]))
+        User.objects.all().delete()
+        Category.objects.all().delete()
+
+        call_command('boot', export=directory, stdout=StringIO())
+
+        self.assertEqual(Product.objects.get().category.slug, 'brick')
+        self.assertEqual(UserProfile.objects.get(user__username='buyer').phone, '+79990000000')
+
+
+class MetricsAccessTests(TestCase):
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_closed_without_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret', DEBUG=False)
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+
+
+class EffectivePriceRefreshTests(TestCase):
+    def _refreshed(self, run):
+        from unittest import mock
+
+        calls = []
+        with mock.patch('store.models.refresh_effective_prices', side_effect=lambda ids: calls.append(set(ids))):
+            with self.captureOnCommitCallbacks(execute=True):
+                run()
+        return calls
+
+    def test_rolled_back_savepoint_is_not_refreshed(self):
+        from django.db import transaction
+
+        from .models import schedule_effective_price_refresh
+
+        def run():
+            schedule_effective_price_refresh([1])
+            with self.assertRaises(ValueError), transaction.atomic():
+                schedule_effective_price_refresh([2])
+                raise ValueError
+            schedule_effective_price_refresh([3])
+
+        calls = self._refreshed(run)
+        self.assertEqual(set().union(*calls), {1, 3})
+
+    def test_rolled_back_transaction_does_not_leak_into_next(self):
+        from django.db import transaction
+
+        from .models import schedule_effective_price_refresh
+
+        def run():
+            with self.assertRaises(ValueError), transaction.atomic():
+                schedule_effective_price_refresh([2])
+                raise ValueError
+            with transaction.atomic():
+                schedule_effective_price_refresh([4])
+
+        self.assertEqual(self._refreshed(run), [{4}])
+
+
+class UploadQueueTests(TransactionTestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        from .supabase_client import install_fake_client, reset_clients
+
+        self.fake = install_fake_client()
+        self.addCleanup(reset_clients)
+        self.queue_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.queue_dir, True)
+
+    def _job(self, **fields):
+        from .models import Category, ImageUploadJob
+        from .uploads import stage_file
+
+        category = Category.objects.create(name='Кирпич', slug='brick')
+        with self.settings(UPLOAD_QUEUE_DIR=self.queue_dir):
+            staged = stage_file(b'data', suffix='.txt')
+        return ImageUploadJob.objects.create(
+            model_label='store.category', object_id=category.pk, path='categories/brick.txt',
+            staged_file=staged, mime_type='text/plain', **fields,
+        )
+
+    def test_final_failure_removes_staged_file(self):
+        import os
+        from unittest import mock
+
+        from .uploads import MAX_ATTEMPTS, process_job
+
+        job = self._job(attempts=MAX_ATTEMPTS)
+        with mock.patch('store.uploads._upload', side_effect=RuntimeError('down')):
+            self.assertFalse(process_job(job))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, job.STATUS_FAILED)
+        self.assertFalse(os.path.exists(job.staged_file))
+
+    def test_background_thread_runs_queue(self):
+        from . import uploads
+
+        job = self._job()
+        uploads.run_in_background()
+        thread = uploads._thread
+        if thread is not None:
+            thread.join(5)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, job.STATUS_DONE)
+        self.assertIn(('upload', 'products', 'categories/brick.txt'),
+                      [call[:3] for call in self.fake.storage.calls])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from .models import Category, Product
+
+        self.category = Category.objects.create(name='Кирпич', slug='brick')
+        now = timezone.now()
+        # Цены идут в обратном порядке к дате: сортировки дают разные страницы
+        for i in range(7):
+            product = Product.objects.create(category=self.category, name=f'Кирпич {i}', slug=f'brick-{i}',
+                                             price=10 + i, stock=5)
+            Product.objects.filter(pk=product.pk).update(created=now - timedelta(hours=i))
+
+    def _pages(self, queryset, ordering, per_page=3):
+        from .pagination import keyset_paginate
+
+        pages = [keyset_paginate(queryset, None, per_page, ordering)]
+        while pages[-1].has_next:
+            pages.append(keyset_paginate(queryset, pages[-1].next_cursor, per_page, ordering))
+        return pages
+
+    def test_next_and_previous_pages(self):
+        from .models import Product
+        from .pagination import keyset_paginate
+
+        products = Product.objects.all()
+        pages = self._pages(products, 'new')
+        names = [[p.name for p in page] for page in pages]
+        self.assertEqual(names, [['Кирпич 0', 'Кирпич 1', 'Кирпич 2'],
+                                 ['Кирпич 3', 'Кирпич 4', 'Кирпич 5'],
+                                 ['Кирпич 6']])
+
+        back = keyset_paginate(products, pages[2].prev_cursor, 3)
+        self.assertEqual([p.name for p in back], names[1])
+        first = keyset_paginate(products, back.prev_cursor, 3)
+        self.assertEqual([p.name for p in first], names[0])
+        self.assertFalse(first.has_previous)
+
+    def test_cursor_keeps_price_sort(self):
+        from .models import Product, annotate_sale_price
+
+        products = annotate_sale_price(Product.objects.all())
+        pages = self._pages(products, '-price')
+        prices = [p.price for page in pages for p in page]
+        self.assertEqual(prices, sorted(prices, reverse=True))
+        self.assertEqual(len(prices), 7)
+
+    def test_category_view_cursor_with_sort(self):
+        from .models import Product
+
+        # На странице категории 12 товаров — нужна вторая страница
+        for i in range(7, 15):
+            Product.objects.create(category=self.category, name=f'Кирпич {i}', slug=f'brick-{i}',
+                                   price=10 + i, stock=5)
+
+        response = self.client.get('/category/brick/', {'sort': 'price', 'cursor': ''})
+        self.assertEqual(response.status_code, 200)
+        first = [p.price for p in response.context['products']]
+        cursor = response.context['products'].next_cursor
+
+        response = self.client.get('/category/brick/', {'sort': 'price', 'cursor': cursor})
+        second = [p.price for p in response.context['products']]
+        self.assertEqual(first + second, sorted(first + second))
+        self.assertLess(max(first), min(second))
+
+        # Курсор другой сортировки не продолжает ее, а открывает первую страницу
+        response = self.client.get('/category/brick/', {'sort': '-price', 'cursor': cursor})
+        self.assertEqual(response.context['products'].object_list[0].price, 24)
+
+
+class PlaceOrderTests(TestCase):
+    class Cart:
+        def __init__(self, quantities):
+            self._quantities = quantities
+            self.cleared = False
+
+        def quantities(self):
+            return dict(self._quantities)
+
+        def clear(self):
+            self.cleared = True
+
+    def setUp(self):
+        from .models import Category, Product
+
+        category = Category.objects.create(name='Кирпич', slug='brick')
+        self.brick = Product.objects.create(category=category, name='Кирпич', slug='brick-1', price=10, stock=5)
+        self.cement = Product.objects.create(category=category, name='Цемент', slug='cement', price=300, stock=1)
+
+    def _order(self):
+        from .models import Order
+
+        return Order(first_name='Иван', last_name='Петров', email='ivan@example.com', phone='+79990000000',
+                     delivery_type='pickup', payment_type='cash')
+
+    def _assert_nothing_changed(self, cart):
+        from .models import Order, OrderItem
+
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(cart.cleared)
+        self.brick.refresh_from_db()
+        self.cement.refresh_from_db()
+        self.assertEqual((self.brick.stock, self.cement.stock), (5, 1))
+
+    def test_places_order_and_clears_cart_on_commit(self):
+        from .orders import place_order
+
+        cart = self.Cart({self.brick.pk: 2, self.cement.pk: 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            order = place_order(self._order(), cart)
+
+        self.assertEqual(order.items.count(), 2)
+        self.assertTrue(cart.cleared)
+        self.cement.refresh_from_db()
+        self.assertEqual(self.cement.stock, 0)
+
+    def test_oversell_rolls_back_everything(self):
+        from .orders import OutOfStockError, place_order
+
+        # Кирпича ровно сколько есть: UPDATE списал бы его до нуля
+        cart = self.Cart({self.brick.pk: 5, self.cement.pk: 2})
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(OutOfStockError) as raised:
+            place_order(self._order(), cart)
+
+        self.assertEqual(raised.exception.products, [self.cement])
+        # Остаток кирпича, списанный тем же UPDATE, вернулся при откате
+        self._assert_nothing_changed(cart)
+
+    def test_concurrent_checkout_takes_last_item(self):
+        from unittest import mock
+
+        from . import orders
+        from .models import Product
+
+        # SELECT в place_order увидел остаток 1, а до UPDATE другой покупатель
+        # забрал последний мешок цемента
+        stale = list(Product.objects.filter(pk__in=[self.brick.pk, self.cement.pk]))
+        Product.objects.filter(pk=self.cement.pk).update(stock=0)
+        real_filter = Product.objects.filter
+        selects = iter([stale])
+
+        def filter(*args, **kwargs):
+            # Первый вызов — SELECT товаров корзины, дальше — настоящие запросы
+            return next(selects, None) or real_filter(*args, **kwargs)
+
+        cart = self.Cart({self.brick.pk: 1, self.cement.pk: 1})
+        with mock.patch.object(Product.objects, 'filter', filter), \
+                self.assertRaises(orders.OutOfStockError) as raised:
+            orders.place_order(self._order(), cart)
+
+        self.assertEqual(raised.exception.products, [self.cement])
+        self.assertFalse(cart.cleared)
+        self.brick.refresh_from_db()
+        self.assertEqual(self.brick.stock, 5)
+
+    def test_deleted_products_and_empty_cart(self):
+        from .orders import EmptyCartError, place_order
+
+        missing = self.Cart({self.cement.pk + 100: 1})
+        with self.assertRaisesMessage(EmptyCartError, 'Товаров из корзины больше нет в каталоге'):
+            place_order(self._order(), missing)
+        with self.assertRaisesMessage(EmptyCartError, 'Корзина пуста'):
+            place_order(self._order(), self.Cart({}))
+        self._assert_nothing_changed(missing)
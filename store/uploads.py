@@ -0,0 +1,329 @@
+"""
+Фоновая загрузка изображений в Supabase.
+
+Форма админки не ждет Supabase: файл копируется во временную папку
+(settings.UPLOAD_QUEUE_DIR), после сохранения объекта создается запись
+ImageUploadJob, и запрос сразу завершается. Воркер
+(manage.py run_upload_worker) забирает задания из таблицы, загружает файл,
+делает адаптивные копии (store/images.py), записывает путь в поле объекта
+и удаляет временный файл. При ошибке задание повторяется с растущей паузой,
+после MAX_ATTEMPTS помечается как failed.
+
+Воркер включается настройкой UPLOAD_WORKER (переменная окружения
+UPLOAD_WORKER=1) и должен видеть ту же папку UPLOAD_QUEUE_DIR, что и
+веб-процесс (общий диск, см. Procfile и README); без явно заданной
+UPLOAD_QUEUE_DIR settings.py и run_upload_worker не запускаются. Без
+воркера очередь после коммита выполняет фоновый поток веб-процесса
+(run_in_background): сохранение в админке не ждет Supabase, повторы
+после ошибок тоже выполняет этот поток.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BufferedReader
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Min, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .images import upload_variants
+from .metrics import observe_upload
+from .page_cache import invalidate_page_cache
+from .supabase_client import get_bucket
+
+MAX_ATTEMPTS = 5
+# Пауза перед повтором: RETRY_DELAY * 2 ** (попытка - 1) секунд
+RETRY_DELAY = 30
+# Задание в статусе running дольше этого считается брошенным (воркер упал)
+STALE_AFTER = timedelta(minutes=10)
+CACHE_CONTROL = 'public, max-age=31536000'
+
+
+def _queue_dir():
+    path = getattr(settings, 'UPLOAD_QUEUE_DIR', '') or os.path.join(settings.MEDIA_ROOT, 'upload_queue')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def stage_file(file, suffix=''):
+    """Копирует загруженный файл (или bytes) во временную папку очереди, возвращает путь"""
+    fd, staged_path = tempfile.mkstemp(suffix=suffix, dir=_queue_dir())
+    with os.fdopen(fd, 'wb') as out:
+        if isinstance(file, (bytes, bytearray)):
+            out.write(file)
+        elif hasattr(file, 'chunks'):
+            if hasattr(file, 'seek'):
+                file.seek(0)
+            for chunk in file.chunks():
+                out.write(chunk)
+        else:
+            if hasattr(file, 'seek'):
+                file.seek(0)
+            shutil.copyfileobj(file, out)
+    return staged_path
+
+
+@contextmanager
+def open_for_upload(file):
+    """
+    Файл, открытый на чтение с диска, для потоковой загрузки в Supabase.
+
+    storage3 отправляет BufferedReader кусками, а bytes и прочие объекты
+    целиком держит в памяти. Файлы, которые уже лежат на диске (временные
+    файлы больших загрузок Django, файлы FileSystemStorage), открываются как
+    есть; остальное сначала копируется во временную папку по кускам.
+    """
+    raw = getattr(file, 'file', file)
+    if hasattr(file, 'temporary_file_path'):
+        path, staged = file.temporary_file_path(), None
+    elif isinstance(raw, BufferedReader) and isinstance(raw.name, str) and os.path.isfile(raw.name):
+        path, staged = raw.name, None
+    else:
+        path = staged = stage_file(file)
+    try:
+        with open(path, 'rb') as f:
+            yield f
+    finally:
+        if staged:
+            os.remove(staged)
+
+
+def defer_image_upload(instance, field_name, file, path, mime_type, save_public_url=False):
+    """
+    Принимает файл для загрузки в Supabase по пути path.
+
+    Файл сразу копируется во временную папку, а задание создается после
+    сохранения instance (сигнал post_save -> enqueue_pending_uploads).
+    """
+    staged_path = stage_file(file, suffix=os.path.splitext(path)[1])
+    pending = instance.__dict__.setdefault('_pending_image_uploads', [])
+    pending.append({
+        'field_name': field_name,
+        'path': path,
+        'staged_file': staged_path,
+        'mime_type': mime_type,
+        'save_public_url': save_public_url,
+    })
+    print(f"📥 Изображение поставлено в очередь загрузки: {path}")
+
+
+def enqueue_pending_uploads(instance):
+    """Создает задания для файлов, принятых defer_image_upload до сохранения объекта"""
+    pending = instance.__dict__.pop('_pending_image_uploads', None)
+    if not pending or instance.pk is None:
+        return []
+
+    from .models import ImageUploadJob
+
+    jobs = ImageUploadJob.objects.bulk_create([
+        ImageUploadJob(model_label=instance._meta.label_lower, object_id=instance.pk, **upload)
+        for upload in pending
+    ])
+    if not worker_enabled():
+        transaction.on_commit(run_in_background)
+    return jobs
+
+
+def worker_enabled():
+    """Запущен ли отдельный воркер (manage.py run_upload_worker)"""
+    return getattr(settings, 'UPLOAD_WORKER', False)
+
+
+_wakeup = threading.Event()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def run_in_background():
+    """
+    Без воркера: будит поток веб-процесса, который выполняет очередь.
+
+    Поток забирает задания так же, как воркер (claim_jobs), спит до
+    ближайшего повтора и завершается, когда ждать больше нечего.
+    """
+    global _thread
+    _wakeup.set()
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_background_loop, name='image-uploads', daemon=True)
+            _thread.start()
+
+
+def _background_loop():
+    global _thread
+    from .models import ImageUploadJob
+
+    try:
+        while True:
+            _wakeup.clear()
+            close_old_connections()
+            jobs = claim_jobs()
+            for job in jobs:
+                process_job(job)
+            if jobs:
+                continue
+
+            next_run = ImageUploadJob.objects.filter(
+                status=ImageUploadJob.STATUS_PENDING,
+            ).aggregate(next_run=Min('run_after'))['next_run']
+            if next_run is None:
+                with _thread_lock:
+                    # Новое задание пришло после claim_jobs — не уходим
+                    if not _wakeup.is_set():
+                        _thread = None
+                        return
+                continue
+            _wakeup.wait(max(0.0, (next_run - timezone.now()).total_seconds()))
+    except Exception as e:
+        print(f"❌ Фоновая загрузка изображений остановилась: {e}")
+        with _thread_lock:
+            _thread = None
+    finally:
+        connection.close()
+
+
+def claim_jobs(limit=10):
+    """Забирает до limit готовых к выполнению заданий и помечает их running"""
+    from .models import ImageUploadJob
+
+    now = timezone.now()
+    ready = (
+        Q(status=ImageUploadJob.STATUS_PENDING, run_after__lte=now)
+        | Q(status=ImageUploadJob.STATUS_RUNNING, updated_at__lt=now - STALE_AFTER)
+    )
+    with transaction.atomic():
+        # skip_locked — несколько воркеров не возьмут одно задание
+        ids = list(
+            ImageUploadJob.objects.select_for_update(skip_locked=True)
+            .filter(ready).order_by('run_after').values_list('id', flat=True)[:limit]
+        )
+        ImageUploadJob.objects.filter(id__in=ids).update(
+            status=ImageUploadJob.STATUS_RUNNING,
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+    return list(ImageUploadJob.objects.filter(id__in=ids).order_by('run_after'))
+
+
+def _upload(job):
+    with open(job.staged_file, 'rb') as f, observe_upload('original', os.fstat(f.fileno()).st_size):
+        get_bucket().upload(job.path, f, {
+            'content-type': job.mime_type,
+            'cache-control': CACHE_CONTROL,
+            # Повтор после сбоя не должен падать на "файл уже существует"
+            'upsert': 'true',
+        })
+
+
+def _has_variants(model, job):
+    """Для основного поля image моделей каталога делаем адаптивные копии"""
+    return (
+        job.field_name == 'image'
+        and job.mime_type.startswith('image/')
+        and any(field.name == 'image_variants' for field in model._meta.get_fields())
+    )
+
+
+def _apply(job):
+    """Записывает загруженный путь (или URL) в поле объекта"""
+    model = apps.get_model(job.model_label)
+    if job.save_public_url:
+        value = get_bucket().get_public_url(job.path)
+    else:
+        value = job.path
+    changes = {job.field_name: value}
+
+    if _has_variants(model, job):
+        changes['image_variants'] = upload_variants(get_bucket(), job.staged_file, job.path, CACHE_CONTROL)
+
+    # update() вместо save(): не запускаем сигналы и не перезаписываем другие поля
+    model._default_manager.filter(pk=job.object_id).update(**changes)
+    # Сигналов нет — кеш страниц с этим изображением сбрасываем сами
+    invalidate_page_cache()
+
+
+def _discard_staged(job):
+    try:
+        os.remove(job.staged_file)
+    except OSError:
+        pass
+
+
+def process_job(job):
+    """Выполняет одно задание; возвращает True при успехе"""
+    from .models import ImageUploadJob
+
+    if not os.path.exists(job.staged_file):
+        # Повторять бесполезно: файл остался на диске другого сервера или
+        # пропал при перезапуске
+        job.status = ImageUploadJob.STATUS_FAILED
+        job.last_error = (f'Временный файл не найден: {job.staged_file}. Веб-процесс и воркер '
+                          f'должны использовать одну папку UPLOAD_QUEUE_DIR')
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'last_error', 'finished_at', 'updated_at'])
+        print(f"❌ {job.last_error}")
+        return False
+
+    try:
+        _upload(job)
+        _apply(job)
+    except Exception as e:
+        job.last_error = f"{type(e).__name__}: {e}"
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = ImageUploadJob.STATUS_FAILED
+            job.finished_at = timezone.now()
+            # Повторов больше не будет — временный файл не нужен
+            _discard_staged(job)
+            print(f"❌ Загрузка {job.path} не удалась после {job.attempts} попыток: {e}")
+        else:
+            job.status = ImageUploadJob.STATUS_PENDING
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+            print(f"⚠️ Загрузка {job.path} не удалась (попытка {job.attempts}), повторим позже: {e}")
+        job.save(update_fields=['status', 'last_error', 'run_after', 'finished_at', 'updated_at'])
+        return False
+
+    job.status = ImageUploadJob.STATUS_DONE
+    job.last_error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'last_error', 'finished_at', 'updated_at'])
+    _discard_staged(job)
+    print(f"✅ Изображение загружено в Supabase: {job.path}")
+    return True
+
+
+def with_upload_status(queryset):
+    """Аннотирует объекты статусом последнего задания загрузки (upload_status)"""
+    from .models import ImageUploadJob
+
+    latest = ImageUploadJob.objects.filter(
+        model_label=queryset.model._meta.label_lower,
+        object_id=OuterRef('pk'),
+    ).order_by('-created_at').values('status')[:1]
+    return queryset.annotate(upload_status=Subquery(latest))
+
+
+def retry_jobs(queryset):
+    """
+    Возвращает задания в очередь (действие админки); без воркера выполняет
+    сразу. Задания, чей временный файл уже удален (окончательная ошибка),
+    повторить нельзя — изображение нужно загрузить заново.
+    """
+    from .models import ImageUploadJob
+
+    queryset = queryset.exclude(status=ImageUploadJob.STATUS_DONE)
+    job_ids = [job_id for job_id, staged_file in queryset.values_list('id', 'staged_file')
+               if os.path.exists(staged_file)]
+    count = ImageUploadJob.objects.filter(id__in=job_ids).update(
+        status=ImageUploadJob.STATUS_PENDING,
+        attempts=0,
+        run_after=timezone.now(),
+        finished_at=None,
+    )
+    if not worker_enabled():
+        transaction.on_commit(run_in_background)
+    return count
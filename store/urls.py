@@ -10,10 +10,12 @@ urlpatterns = [
     path('category/<slug:category_slug>/', views.category_view, name='category'),
     path('product/<slug:product_slug>/', views.product_detail, name='product_detail'),
     path('search/', views.search, name='search'),
+    path('api/search/suggest/', views.search_suggest, name='search_suggest'),
+    path('api/products/', views.api_products, name='api_products'),
     path('cart/', views.cart_view, name='cart'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
-    path('cart/update/<int:cart_id>/', views.update_cart, name='update_cart'),
-    path('cart/remove/<int:cart_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/update/<int:product_id>/', views.update_cart, name='update_cart'),
+    path('cart/remove/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('checkout/', views.checkout, name='checkout'),
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
 
@@ -3,7 +3,7 @@ from django.db.models import Q
 from django.core.paginator import Paginator
 from django.http import JsonResponse
 from django.contrib import messages
-from .models import Category, Product, Cart, Order, OrderItem
+from .models import Category, Product, Order, OrderItem
 from .forms import OrderForm
 
 from django.shortcuts import render, get_object_or_404, redirect
@@ -13,154 +13,245 @@ from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
-from .models import Category, Product, Cart, Order, OrderItem, UserProfile
+from .models import Category, Product, Order, OrderItem, UserProfile, attach_promotions, annotate_sale_price
 #from .forms import RegisterForm, LoginForm, ProfileForm, UserProfileForm, OrderForm, PasswordChangeForm
 from .forms import RegisterForm, LoginForm, ProfileForm, UserProfileForm, OrderForm
+from .search import search_ordering, search_products
+from .facets import selected_facets, facet_counts, apply_facets
+from .pagination import DEFAULT_ORDERING, keyset_paginate
+from .cart import CartUnavailable, SessionCart
+from .orders import place_order, EmptyCartError, OutOfStockError
+from .suggest import suggest_index, MAX_LIMIT as MAX_SUGGEST_LIMIT
+from .page_cache import cache_anonymous_page
+from . import metrics
+from django.urls import reverse
+from urllib.parse import urlencode
 from django.contrib.auth.forms import PasswordChangeForm  # Импортируем из Django
 
+@cache_anonymous_page
 def index(request):
-    categories = Category.objects.all()
     featured_products = Product.objects.filter(available=True)[:8]
     new_products = Product.objects.filter(available=True).order_by('-created')[:8]
+    featured_products = attach_promotions(featured_products)
+    new_products = attach_promotions(new_products)
 
     context = {
-        'categories': categories,
         'featured_products': featured_products,
         'new_products': new_products,
     }
     return render(request, 'store/index.html', context)
 
 
+@cache_anonymous_page
 def category_view(request, category_slug):
     category = get_object_or_404(Category, slug=category_slug)
-    categories = Category.objects.all()
     products = Product.objects.filter(category=category, available=True)
 
-    # Пагинация
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Фасетные фильтры и счетчики
+    selected = selected_facets(request.GET)
+    facets = facet_counts(products, selected)
+    products = apply_facets(products, selected)
+
+    # Сортировка по реальной цене (с учетом акций) выполняется в SQL
+    sort = request.GET.get('sort')
+    ordering = DEFAULT_ORDERING
+    if sort in ('price', '-price'):
+        products = annotate_sale_price(products).order_by(
+            sort.replace('price', 'effective_sale_price'), 'id'
+        )
+        ordering = sort
+
+    # Пагинация: по курсору (?cursor=) или классическая по номеру страницы;
+    # курсор продолжает ту же сортировку
+    if 'cursor' in request.GET:
+        page_obj = keyset_paginate(products, request.GET['cursor'], 12, ordering)
+    else:
+        paginator = Paginator(products, 12)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
+    page_obj.object_list = attach_promotions(page_obj.object_list)
 
     context = {
         'category': category,
         'products': page_obj,
-        'categories': categories,
+        'facets': facets,
     }
     return render(request, 'store/category.html', context)
 
 
+@cache_anonymous_page
 def product_detail(request, product_slug):
     product = get_object_or_404(Product, slug=product_slug, available=True)
     product_images = product.images.all()
-    categories = Category.objects.all()
     related_products = Product.objects.filter(
         category=product.category, available=True
     ).exclude(id=product.id)[:4]
+    related_products = attach_promotions(related_products)
+    attach_promotions([product])
 
     context = {
         'product': product,
         'product_images': product_images,
         'related_products': related_products,
-        'categories': categories,
     }
     return render(request, 'store/product_detail.html', context)
 
 
 def search(request):
-    categories = Category.objects.all()
     query = request.GET.get('q', '')
     if query:
-        products = Product.objects.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(brand__icontains=query) |
-            Q(material__icontains=query),
-            available=True
-        )
+        products = search_products(Product.objects.filter(available=True), query)
     else:
         products = Product.objects.filter(available=True)
+    ordering = search_ordering(query)
 
-    # Пагинация
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Фасетные фильтры и счетчики
+    selected = selected_facets(request.GET)
+    facets = facet_counts(products, selected)
+    products = apply_facets(products, selected)
+
+    # Пагинация: по курсору (?cursor=) или классическая по номеру страницы
+    if 'cursor' in request.GET:
+        page_obj = keyset_paginate(products, request.GET['cursor'], 12, ordering)
+    else:
+        paginator = Paginator(products, 12)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
+    page_obj.object_list = attach_promotions(page_obj.object_list)
+
+    if query:
+        metrics.SEARCHES.inc()
+        if not page_obj.object_list and 'cursor' not in request.GET:
+            metrics.ZERO_RESULT_SEARCHES.inc()
 
     context = {
         'query': query,
         'products': page_obj,
-        'categories': categories,
+        'facets': facets,
     }
     return render(request, 'store/search.html', context)
 
 
-def cart_view(request):
-    cart_items = Cart.objects.filter(session_key=request.session.session_key)
-    total_price = sum(item.total_price for item in cart_items)
-    categories = Category.objects.all()
+def search_suggest(request):
+    """API подсказок для строки поиска"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), MAX_SUGGEST_LIMIT)
+    except ValueError:
+        limit = 8
+
+    suggest_index.ensure_fresh()
+    results = []
+    for entry in suggest_index.suggest(query, limit):
+        if entry['type'] == 'product':
+            url = reverse('store:product_detail', args=[entry['slug']])
+        elif entry['type'] == 'category':
+            url = reverse('store:category', args=[entry['slug']])
+        else:
+            url = f"{reverse('store:search')}?{urlencode({'q': entry['title']})}"
+        results.append({'type': entry['type'], 'title': entry['title'], 'url': url})
+
+    return JsonResponse({'query': query, 'results': results})
 
 
+def api_products(request):
+    """API списка товаров с keyset-пагинацией (?category=&q=&cursor=&limit=)"""
+    products = Product.objects.filter(available=True)
+    category_slug = request.GET.get('category')
+    if category_slug:
+        products = products.filter(category__slug=category_slug)
+    query = request.GET.get('q', '').strip()
+    if query:
+        products = search_products(products, query)
+    products = apply_facets(products, selected_facets(request.GET))
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 24)), 1), 100)
+    except ValueError:
+        limit = 24
+
+    page = keyset_paginate(products, request.GET.get('cursor'), limit, search_ordering(query))
+    items = [
+        {
+            'id': product.id,
+            'name': product.name,
+            'url': product.get_absolute_url(),
+            'image': product.get_main_image(),
+            'unit': product.unit,
+            'price': str(product.price),
+            'sale_price': str(product.promotion_price),
+            'has_promotion': product.has_promotion,
+        }
+        for product in attach_promotions(page.object_list)
+    ]
+
+    return JsonResponse({
+        'results': items,
+        'next': page.next_cursor,
+        'previous': page.prev_cursor,
+        'approx_total': page.approx_count,
+    })
+
+
+def cart_view(request):
+    cart = SessionCart(request)
 
     context = {
-        'cart_items': cart_items,
-        'total_price': total_price,
-        'categories': categories,
+        'cart_items': cart.lines,
+        'total_price': cart.total_price,
     }
     return render(request, 'store/cart.html', context)
 
 
-def add_to_cart(request, product_id):
-    product = get_object_or_404(Product, id=product_id, available=True)
+CART_UNAVAILABLE_MESSAGE = 'Корзина временно недоступна, попробуйте еще раз через минуту'
 
-    if not request.session.session_key:
-        request.session.create()
 
-    cart_item, created = Cart.objects.get_or_create(
-        session_key=request.session.session_key,
-        product=product,
-        defaults={'quantity': 1}
-    )
+def add_to_cart(request, product_id):
+    product = get_object_or_404(Product, id=product_id, available=True)
 
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    try:
+        SessionCart(request).add(product)
+    except CartUnavailable:
+        messages.error(request, CART_UNAVAILABLE_MESSAGE)
+        return redirect(product.get_absolute_url())
+    metrics.CART_ADDS.inc()
 
     messages.success(request, f'Товар "{product.name}" добавлен в корзину')
     return redirect('store:cart')
 
 
-def update_cart(request, cart_id):
+def update_cart(request, product_id):
     if request.method == 'POST':
-        cart_item = get_object_or_404(Cart, id=cart_id)
         quantity = int(request.POST.get('quantity', 1))
-
-        if quantity > 0:
-            cart_item.quantity = quantity
-            cart_item.save()
+        try:
+            SessionCart(request).update(product_id, quantity)
+        except CartUnavailable:
+            messages.error(request, CART_UNAVAILABLE_MESSAGE)
         else:
-            cart_item.delete()
-
-        messages.success(request, 'Корзина обновлена')
+            messages.success(request, 'Корзина обновлена')
 
     return redirect('store:cart')
 
 
-def remove_from_cart(request, cart_id):
-    cart_item = get_object_or_404(Cart, id=cart_id)
-    cart_item.delete()
-    messages.success(request, 'Товар удален из корзины')
+def remove_from_cart(request, product_id):
+    try:
+        SessionCart(request).remove(product_id)
+    except CartUnavailable:
+        messages.error(request, CART_UNAVAILABLE_MESSAGE)
+    else:
+        messages.success(request, 'Товар удален из корзины')
     return redirect('store:cart')
 
 #@login_required
 def checkout(request):
-    categories = Category.objects.all()
-    cart_items = Cart.objects.filter(session_key=request.session.session_key)
+    cart = SessionCart(request)
     # cart = get_object_or_404(Cart, user=request.user)
     delivery_cost_fin = 0
     # context = {
     #     'categories': categories,
     # }
 
-    if not cart_items.exists():
+    if not cart:
         messages.warning(request, 'Ваша корзина пуста')
         return redirect('store:cart')
 
@@ -211,37 +302,38 @@ def checkout(request):
                 delivery_address = pickup_point
 
 
-            order = form.save()
-            # Рассчитываем итоговую сумму
-            # total_amount = cart.total_price + delivery_cost
-            # Создаем элементы заказа
-
-            for cart_item in cart_items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    price=cart_item.product.price,
-                    quantity=cart_item.quantity
-                )
+            order = form.save(commit=False)
 
-            # Очищаем корзину
-            cart_items.delete()
+            # Заказ, позиции, остатки и очистка корзины — одной транзакцией
+            try:
+                place_order(order, cart)
+            except OutOfStockError as e:
+                metrics.CHECKOUTS.labels('out_of_stock').inc()
+                messages.error(request, str(e))
+                return redirect('store:cart')
+            except EmptyCartError as e:
+                metrics.CHECKOUTS.labels('empty_cart').inc()
+                messages.error(request, str(e))
+                return redirect('store:cart')
 
+            metrics.CHECKOUTS.labels('success').inc()
             messages.success(request, 'Ваш заказ успешно оформлен!')
             return redirect('store:index',)
 
+        metrics.CHECKOUTS.labels('invalid').inc()
+
     else:
 
         form = OrderForm()
 
-    total_price = sum(item.total_price for item in cart_items)+delivery_cost_fin
+    total_price = cart.total_price + delivery_cost_fin
 
 
     context = {
         'form': form,
-        'cart_items': cart_items,
+        'cart': cart,
+        'cart_items': cart.lines,
         'total_price': total_price,
-        'categories':categories,
 
 
     }
@@ -250,7 +342,6 @@ def checkout(request):
 
 # Регистрация
 def register_view(request):
-    categories = Category.objects.all()
     if request.user.is_authenticated:
         return redirect('store:index')
 
@@ -264,12 +355,11 @@ def register_view(request):
     else:
         form = RegisterForm()
 
-    return render(request, 'store/auth/register.html', {'form': form,'categories': categories})
+    return render(request, 'store/auth/register.html', {'form': form})
 
 
 # Авторизация
 def login_view(request):
-    categories = Category.objects.all()
     if request.user.is_authenticated:
         return redirect('store:index')
 
@@ -289,7 +379,7 @@ def login_view(request):
     else:
         form = LoginForm()
 
-    return render(request, 'store/auth/login.html', {'form': form,'categories': categories})
+    return render(request, 'store/auth/login.html', {'form': form})
 
 
 # Выход
@@ -303,20 +393,17 @@ def logout_view(request):
 @login_required
 def profile_view(request):
     user = request.user
-    categories = Category.objects.all()
     orders = Order.objects.filter(email=user.email).order_by('-created')[:10]
 
     return render(request, 'store/auth/profile.html', {
         'user': user,
         'orders': orders,
-        'categories': categories,
     })
 
 
 # Редактирование профиля
 @login_required
 def edit_profile_view(request):
-    categories = Category.objects.all()
     if request.method == 'POST':
         user_form = ProfileForm(request.POST, instance=request.user)
         profile_form = UserProfileForm(request.POST, request.FILES, instance=request.user.userprofile)
@@ -333,14 +420,12 @@ def edit_profile_view(request):
     return render(request, 'store/auth/edit_profile.html', {
         'user_form': user_form,
         'profile_form': profile_form,
-        'categories': categories,
     })
 
 
 # Изменение пароля
 @login_required
 def change_password_view(request):
-    categories = Category.objects.all()
     if request.method == 'POST':
         form = PasswordChangeForm(request.user, request.POST)
         if form.is_valid():
@@ -351,25 +436,23 @@ def change_password_view(request):
     else:
         form = PasswordChangeForm(request.user)
 
-    return render(request, 'store/auth/change_password.html', {'form': form,'categories': categories})
+    return render(request, 'store/auth/change_password.html', {'form': form})
 
 
 # История заказов
 @login_required
 def order_history_view(request):
-    categories = Category.objects.all()
     orders = Order.objects.filter(email=request.user.email).order_by('-created')
 
-    return render(request, 'store/auth/order_history.html', {'orders': orders, 'categories': categories})
+    return render(request, 'store/auth/order_history.html', {'orders': orders})
 
 
 # Детали заказа
 @login_required
 def order_detail_view(request, order_id):
-    categories = Category.objects.all()
     order = get_object_or_404(Order, id=order_id, email=request.user.email)
 
-    return render(request, 'store/auth/order_detail.html', {'order': order,'categories':categories})
+    return render(request, 'store/auth/order_detail.html', {'order': order})
 
 
 # В views.py добавьте:
@@ -430,15 +513,15 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 
+@cache_anonymous_page
 def about(request):
-    categories = Category.objects.all()
     """Страница О нас"""
-    return render(request, 'store/about.html',context={'categories': categories})
+    return render(request, 'store/about.html')
 
+@cache_anonymous_page
 def otzov(request):
-    categories = Category.objects.all()
     """Страница отзывов"""
-    return render(request, 'store/otzov.html',context={'categories': categories})
+    return render(request, 'store/otzov.html')
 
 
 @csrf_exempt
@@ -564,6 +647,9 @@ def products_on_promotion(request):
         promotion__in=promotions
     ).select_related('product', 'promotion').order_by('-priority')
 
+    # Текущая акция каждого товара — одним запросом на всю выборку
+    attach_promotions(pp.product for pp in product_promotions)
+
     # Группируем товары по акциям
     grouped_products = {}
     for pp in product_promotions:
@@ -1,24 +1,32 @@
 # supabase_storage.py
 import os
+import posixpath
 from urllib.parse import urljoin
+from django.core.cache import cache
 from django.core.files.storage import Storage
 from django.utils.deconstruct import deconstructible
 from django.conf import settings
-from supabase import create_client
+from store.supabase_client import get_supabase_client
+from store.metrics import observe_upload
+from store.uploads import open_for_upload
 import uuid
 
+# Сколько секунд помнить, есть ли файл в bucket и его размер
+METADATA_TTL = 60
+
 
 @deconstructible
 class SupabaseStorage(Storage):
     """Кастомный storage для работы с Supabase"""
 
     def __init__(self, option=None):
-        self.supabase = create_client(
-            settings.SUPABASE_URL,
-            settings.SUPABASE_KEY
-        )
         self.bucket_name = getattr(settings, 'SUPABASE_BUCKET', 'public')
 
+    @property
+    def supabase(self):
+        # Общий для процесса клиент с пулом соединений
+        return get_supabase_client()
+
     def _open(self, name, mode='rb'):
         # Для чтения файлов
         from io import BytesIO
@@ -37,15 +45,7 @@ class SupabaseStorage(Storage):
             ext = os.path.splitext(content.name)[1]
             name = f"products/{uuid.uuid4()}{ext}"
 
-        # Проверяем, содержит ли name путь к папке
-        if 'products/' not in name:
-            name = f"products/{name}"
-
-        # Читаем содержимое файла
-        if hasattr(content, 'read'):
-            file_content = content.read()
-        else:
-            file_content = content
+        name = self._full_name(name)
 
         # Определяем content-type
         content_type = self._get_content_type(name)
@@ -59,13 +59,17 @@ class SupabaseStorage(Storage):
             except:
                 pass  # Файл не существует, это нормально
 
-            # Загружаем новый файл
-            result = self.supabase.storage.from_(self.bucket_name).upload(
-                name,
-                file_content,
-                {"content-type": content_type}
-            )
-
+            # Загружаем новый файл потоком, не читая его целиком в память
+            with open_for_upload(content) as file:
+                size = os.fstat(file.fileno()).st_size
+                with observe_upload('storage', size):
+                    result = self.supabase.storage.from_(self.bucket_name).upload(
+                        name,
+                        file,
+                        {"content-type": content_type}
+                    )
+
+            self._remember(name, {'size': size})
             print(f"File uploaded successfully: {name}")
             return name
 
@@ -76,18 +80,49 @@ class SupabaseStorage(Storage):
     def delete(self, name):
         try:
             self.supabase.storage.from_(self.bucket_name).remove([name])
+            cache.delete(self._metadata_key(self._full_name(name)))
         except Exception as e:
             print(f"Error deleting file {name}: {e}")
 
+    def _full_name(self, name):
+        # Все файлы лежат в папке products/
+        if 'products/' not in name:
+            name = f"products/{name}"
+        return name
+
+    def _metadata_key(self, name):
+        return f'supabase_meta:{self.bucket_name}:{name}'
+
+    def _remember(self, name, metadata):
+        cache.set(self._metadata_key(name), metadata or False, METADATA_TTL)
+
+    def _metadata(self, name):
+        """
+        Метаданные файла ({'size': ...}) или None, если файла нет.
+
+        Запрашивается только папка файла с фильтром по имени, а не весь
+        bucket; результат кешируется на METADATA_TTL секунд.
+        """
+        name = self._full_name(name)
+        cached = cache.get(self._metadata_key(name))
+        if cached is not None:
+            return cached or None
+
+        directory, filename = posixpath.split(name)
+        files = self.supabase.storage.from_(self.bucket_name).list(
+            directory, {'search': filename, 'limit': 100}
+        )
+        metadata = None
+        for file_info in files:
+            if file_info.get('name') == filename:
+                metadata = {'size': (file_info.get('metadata') or {}).get('size', 0)}
+                break
+        self._remember(name, metadata)
+        return metadata
+
     def exists(self, name):
         try:
-            # Получаем список файлов в bucket
-            files = self.supabase.storage.from_(self.bucket_name).list()
-            # Ищем файл по имени
-            for file_info in files:
-                if file_info.get('name') == name:
-                    return True
-            return False
+            return self._metadata(name) is not None
         except Exception as e:
             print(f"Error checking existence of {name}: {e}")
             return False
@@ -126,11 +161,7 @@ class SupabaseStorage(Storage):
 
     def size(self, name):
         try:
-            # Получаем метаданные файла
-            files = self.supabase.storage.from_(self.bucket_name).list()
-            for file_info in files:
-                if file_info.get('name') == name:
-                    return file_info.get('metadata', {}).get('size', 0)
-            return 0
+            metadata = self._metadata(name)
+            return metadata['size'] if metadata else 0
         except:
             return 0
\ No newline at end of file